@@ -22,6 +22,9 @@ if GOOGLE_API_KEY:
 else:
     logger.error("GOOGLE_API_KEY not found in environment variables")
 
+# Shared Gemini model; building it per request repeats the SDK's client setup
+GEMINI_MODEL = genai.GenerativeModel('gemini-1.5-flash') if GOOGLE_API_KEY else None
+
 app = FastAPI(
     title="Receipt Processing API",
     description="API to process receipt images and extract categorized information",
@@ -103,14 +106,11 @@ If you cannot extract certain information, use null for those fields.
 def process_receipt_with_gemini(image_data):
     """Process receipt image using Gemini API"""
     try:
-        # Initialize the model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
         # Convert image data to PIL Image
         image = Image.open(io.BytesIO(image_data))
         
         # Generate content
-        response = model.generate_content([RECEIPT_PROCESSING_PROMPT, image])
+        response = GEMINI_MODEL.generate_content([RECEIPT_PROCESSING_PROMPT, image])
         
         # Extract JSON from response
         response_text = response.text.strip()
@@ -132,9 +132,6 @@ def process_receipt_with_gemini(image_data):
 def process_receipt_json_with_gemini(receipt_data):
     """Process receipt JSON data using Gemini API"""
     try:
-        # Initialize the model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
         prompt = f"""
         You are a smart categorization assistant.
 
@@ -165,7 +162,7 @@ def process_receipt_json_with_gemini(receipt_data):
         """
         
         # Generate content
-        response = model.generate_content(prompt)
+        response = GEMINI_MODEL.generate_content(prompt)
         
         # Extract JSON from response
         response_text = response.text.strip()
@@ -200,8 +197,7 @@ async def test_api():
         if not GOOGLE_API_KEY:
             return {"error": "API key not configured"}
         
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content("Say hello")
+        response = GEMINI_MODEL.generate_content("Say hello")
         
         return {
             "status": "success",
@@ -4,15 +4,23 @@ Test client for the Receipt Processing API
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import sys
 import argparse
 from pathlib import Path
 
+# One keep-alive session for the health check and receipt uploads; retries ride out Cloud Run cold starts
+session = requests.Session()
+_adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3))
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
 def test_health_check(base_url):
     """Test the health check endpoint"""
     try:
-        response = requests.get(f"{base_url}/health")
+        response = session.get(f"{base_url}/health")
         if response.status_code == 200:
             print("✅ Health check passed")
             print(f"Response: {response.json()}")
@@ -33,7 +41,7 @@ def test_process_receipt_image(base_url, image_path):
     try:
         with open(image_path, 'rb') as f:
             files = {'file': (Path(image_path).name, f, 'image/jpeg')}
-            response = requests.post(f"{base_url}/process-receipt", files=files)
+            response = session.post(f"{base_url}/process-receipt", files=files)
         
         if response.status_code == 200:
             print("✅ Receipt image processing successful")
@@ -66,7 +74,7 @@ def test_process_receipt_json(base_url):
     }
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{base_url}/process-receipt-json",
             json=test_data,
             headers={'Content-Type': 'application/json'}
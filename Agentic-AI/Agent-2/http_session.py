@@ -0,0 +1,40 @@
+"""
+Keep-alive HTTP sessions shared by the Agent-2 test scripts
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def create_session() -> requests.Session:
+    """Create a JSON session that reuses pooled connections and retries transient failures"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# requests.Session is not thread-safe, so concurrent callers each get their own
+_thread_local = threading.local()
+_sessions = []
+_sessions_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Return this thread's session, creating it on first use"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = create_session()
+        _thread_local.session = session
+        with _sessions_lock:
+            _sessions.append(session)
+    return session
+
+def close_sessions():
+    """Close every session handed out by get_session"""
+    with _sessions_lock:
+        for session in _sessions:
+            session.close()
+        _sessions.clear()
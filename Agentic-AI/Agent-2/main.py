@@ -1,15 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import os
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import uuid
 import base64
 import hashlib
 import hmac
+import asyncio
+import time
+import shutil
+import tempfile
+import numpy as np
+import blake3
+import orjson
+from cachetools import TTLCache
+
+# uvicorn runs several worker processes, so metrics go to a shared directory that /metrics aggregates.
+# prometheus_client picks multiprocess mode at import time, so this must be set before importing it.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "agent2-prometheus")
+)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+from prometheus_client import CollectorRegistry, Histogram, make_asgi_app, multiprocess
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -18,7 +35,9 @@ load_dotenv()
 # Google Cloud and AI imports
 import google.generativeai as genai
 from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
 from google.cloud import aiplatform
+from vertexai.language_models import TextEmbeddingModel
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 import requests
@@ -34,6 +53,46 @@ GOOGLE_SERVICE_ACCOUNT_PATH = os.getenv("GOOGLE_SERVICE_ACCOUNT_PATH")
 WALLET_ISSUER_ID = os.getenv("WALLET_ISSUER_ID")
 WALLET_CLASS_ID = os.getenv("WALLET_CLASS_ID")
 
+# Pass IDs without a version prefix were derived from an MD5 user hash
+PASS_ID_VERSION = "v2"
+
+# Embedding configuration
+EMBEDDING_MODEL_NAME = "text-embedding-004"
+EMBEDDING_FALLBACK_MODEL_NAME = "blake3-hash-fallback"
+EMBEDDING_DIMENSIONS = 768
+EMBEDDING_BATCH_SIZE = 32
+EMBEDDING_BATCH_INTERVAL_SECONDS = 0.01
+
+# Concurrency limits per external service, so bursts queue locally instead of piling onto the APIs
+VERTEX_AI_CONCURRENCY = 4
+FIRESTORE_COMMIT_CONCURRENCY = 8
+vertex_ai_semaphore = asyncio.Semaphore(VERTEX_AI_CONCURRENCY)
+firestore_commit_semaphore = asyncio.Semaphore(FIRESTORE_COMMIT_CONCURRENCY)
+
+# Latency histograms exposed on /metrics
+LATENCY_BUCKETS = (.01, .025, .05, .1, .25, .5, 1, 2, 5)
+HTTP_REQUEST_LATENCY = Histogram("http_request_seconds", "HTTP request latency until response start", ["method", "route"], buckets=LATENCY_BUCKETS)
+VERTEX_AI_LATENCY = Histogram("vertex_ai_call_seconds", "Vertex AI call latency", ["op"], buckets=LATENCY_BUCKETS)
+FIRESTORE_LATENCY = Histogram("firestore_call_seconds", "Firestore call latency", ["op"], buckets=LATENCY_BUCKETS)
+
+# Bulk ingestion configuration
+MAX_BATCH_RECEIPTS = 500
+BATCH_CONCURRENCY = 16
+FIRESTORE_BATCH_WRITE_LIMIT = 500
+MAX_WRITES_PER_RECEIPT = 4
+
+# Each worker keeps its own vector index; re-read recent embeddings from other workers this often
+VECTOR_INDEX_REFRESH_SECONDS = 5
+VECTOR_INDEX_REFRESH_OVERLAP = timedelta(seconds=30)
+
+# Receipt read cache; receipts are not modified after they are stored
+RECEIPT_CACHE_MAXSIZE = 1000
+RECEIPT_CACHE_TTL_SECONDS = 600
+RECEIPT_CACHE_CONTROL = f"private, max-age={RECEIPT_CACHE_TTL_SECONDS}"
+
+# Clients sending this Accept type get list results streamed one JSON document per line
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 # Configure Google AI
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
@@ -41,35 +100,83 @@ if GOOGLE_API_KEY:
 else:
     logger.error("GOOGLE_API_KEY not found in environment variables")
 
-# Initialize Firestore client
-try:
-    if GOOGLE_SERVICE_ACCOUNT_PATH and os.path.exists(GOOGLE_SERVICE_ACCOUNT_PATH):
-        credentials = service_account.Credentials.from_service_account_file(GOOGLE_SERVICE_ACCOUNT_PATH)
-        db = firestore.Client(project=GOOGLE_PROJECT_ID, credentials=credentials)
-        logger.info("Firestore client initialized with service account")
-    else:
-        db = firestore.Client(project=GOOGLE_PROJECT_ID)
-        logger.info("Firestore client initialized with default credentials")
-except Exception as e:
-    logger.error(f"Failed to initialize Firestore client: {str(e)}")
-    db = None
+def create_firestore_client():
+    """Create the Firestore client; called per worker process on startup"""
+    try:
+        if GOOGLE_SERVICE_ACCOUNT_PATH and os.path.exists(GOOGLE_SERVICE_ACCOUNT_PATH):
+            credentials = service_account.Credentials.from_service_account_file(GOOGLE_SERVICE_ACCOUNT_PATH)
+            client = firestore.AsyncClient(project=GOOGLE_PROJECT_ID, credentials=credentials)
+            logger.info("Firestore client initialized with service account")
+        else:
+            client = firestore.AsyncClient(project=GOOGLE_PROJECT_ID)
+            logger.info("Firestore client initialized with default credentials")
+        return client
+    except Exception as e:
+        logger.error(f"Failed to initialize Firestore client: {str(e)}")
+        return None
+
+# Firestore client, created in the startup event so each worker owns its gRPC channel
+db = None
 
 # Initialize Vertex AI
+embedding_model = None
 try:
     if GOOGLE_PROJECT_ID:
         aiplatform.init(project=GOOGLE_PROJECT_ID, location="us-central1")
         logger.info("Vertex AI initialized successfully")
+        embedding_model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_NAME)
+        logger.info(f"Vertex AI embedding model {EMBEDDING_MODEL_NAME} loaded")
     else:
         logger.error("GOOGLE_PROJECT_ID not found for Vertex AI initialization")
 except Exception as e:
     logger.error(f"Failed to initialize Vertex AI: {str(e)}")
 
+def orjson_default(value: Any):
+    """Serialize values orjson does not handle natively, such as Firestore's DatetimeWithNanoseconds"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+class FirestoreJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson, including Firestore timestamp subclasses"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
 app = FastAPI(
     title="Receipt Storage and Wallet API",
     description="API to store receipt data in Firestore, create embeddings, and generate Google Wallet passes",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FirestoreJSONResponse
 )
 
+@app.on_event("startup")
+async def startup_event():
+    """Create this worker's Firestore client and warm the in-memory vector index"""
+    global db
+    db = create_firestore_client()
+    
+    try:
+        await load_vector_index()
+    except Exception as e:
+        logger.error(f"Failed to load vector index: {str(e)}")
+
+@app.middleware("http")
+async def record_request_latency(request, call_next):
+    """Observe per-route request latency for /metrics"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_LATENCY.labels(request.method, route.path if route else "unmatched").observe(time.perf_counter() - start)
+    return response
+
+# Expose Prometheus metrics aggregated across all worker processes
+metrics_registry = CollectorRegistry()
+multiprocess.MultiProcessCollector(metrics_registry)
+app.mount("/metrics", make_asgi_app(registry=metrics_registry))
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -114,130 +221,337 @@ class WalletPassData(BaseModel):
     category: str
     pass_id: str
 
-def generate_embeddings(text: str) -> List[float]:
-    """Generate embeddings using Google's text embedding model"""
+def hash_embedding(text: str) -> List[float]:
+    """Deterministic pseudo-embedding used when Vertex AI embeddings are unavailable"""
+    digest = blake3.blake3(text.encode()).digest(length=EMBEDDING_DIMENSIONS)
+    return (np.frombuffer(digest, dtype=np.uint8).astype(np.float32) / 255.0).tolist()
+
+class EmbeddingBatcher:
+    """Coalesce concurrent embedding requests into batched Vertex AI calls"""
+    
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE, interval: float = EMBEDDING_BATCH_INTERVAL_SECONDS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending: List[tuple] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Strong references to in-flight batch tasks so they aren't garbage-collected mid-call
+        self._tasks: set = set()
+    
+    async def embed(self, text: str) -> tuple:
+        """Queue a text and wait for its (embedding, model_name) result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.interval, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, batch: List[tuple]):
+        texts = [text for text, _ in batch]
+        try:
+            async with vertex_ai_semaphore:
+                with VERTEX_AI_LATENCY.labels("get_embeddings").time():
+                    embeddings = await asyncio.to_thread(embedding_model.get_embeddings, texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+            results = [(embedding.values, EMBEDDING_MODEL_NAME) for embedding in embeddings]
+        except Exception as e:
+            logger.error(f"Error generating Vertex AI embeddings for batch of {len(texts)}: {str(e)}")
+            results = [(hash_embedding(text), EMBEDDING_FALLBACK_MODEL_NAME) for text in texts]
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        
+        # Never leave a caller waiting on a future this batch didn't resolve
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batch returned no result for this text"))
+
+embedding_batcher = EmbeddingBatcher()
+
+async def generate_embeddings(text: str) -> tuple:
+    """Generate embeddings using Vertex AI text embeddings, returning (embedding, model_name)"""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Create a prompt for embedding generation
-        embedding_prompt = f"Generate a semantic representation for this receipt data: {text}"
+        if embedding_model is None:
+            return hash_embedding(text), EMBEDDING_FALLBACK_MODEL_NAME
         
-        # For now, we'll use a simple hash-based approach since Gemini doesn't directly provide embeddings
-        # In production, you'd use Vertex AI's text embedding models
-        import hashlib
-        text_hash = hashlib.md5(text.encode()).hexdigest()
-        
-        # Convert hash to pseudo-embedding (768 dimensions)
-        embedding = []
-        for i in range(0, len(text_hash), 2):
-            hex_pair = text_hash[i:i+2]
-            embedding.append(int(hex_pair, 16) / 255.0)
-        
-        # Pad to 768 dimensions
-        while len(embedding) < 768:
-            embedding.extend(embedding[:min(len(embedding), 768 - len(embedding))])
-        
-        return embedding[:768]
+        return await embedding_batcher.embed(text)
         
     except Exception as e:
         logger.error(f"Error generating embeddings: {str(e)}")
         # Return zero vector as fallback
-        return [0.0] * 768
+        return [0.0] * EMBEDDING_DIMENSIONS, EMBEDDING_FALLBACK_MODEL_NAME
+
+class VectorIndex:
+    """In-memory float32 embedding matrix for cosine-similarity receipt search"""
+    
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, initial_capacity: int = 1024):
+        self.dimensions = dimensions
+        self.embeddings = np.zeros((initial_capacity, dimensions), dtype=np.float32)
+        self.ids: List[str] = []
+        self.size = 0
+        self._positions: Dict[str, int] = {}
+        self._user_rows: Dict[str, List[int]] = {}
+        self.loaded_until: Optional[datetime] = None
+        self.refreshed_at = time.monotonic()
+    
+    def add(self, document_id: str, embedding: List[float], user_id: Optional[str]):
+        """Insert or replace a document's embedding, L2-normalized for cosine scoring"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dimensions,) or not np.linalg.norm(vector):
+            logger.warning(f"Skipping unusable embedding for document: {document_id}")
+            return
+        
+        row = self._positions.get(document_id)
+        if row is None:
+            if self.size == len(self.embeddings):
+                grown = np.zeros((len(self.embeddings) * 2, self.dimensions), dtype=np.float32)
+                grown[:self.size] = self.embeddings[:self.size]
+                self.embeddings = grown
+            row = self.size
+            self.size += 1
+            self.ids.append(document_id)
+            self._positions[document_id] = row
+            self._user_rows.setdefault(user_id, []).append(row)
+        
+        self.embeddings[row] = vector / np.linalg.norm(vector)
+    
+    def search(self, query_embedding: List[float], limit: int, user_id: Optional[str] = None) -> List[str]:
+        """Return up to `limit` document IDs ranked by cosine similarity to the query"""
+        rows = self._user_rows.get(user_id, []) if user_id else None
+        count = len(rows) if rows is not None else self.size
+        if limit <= 0 or count == 0:
+            return []
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if query.shape != (self.dimensions,) or not norm:
+            return []
+        query /= norm
+        
+        if rows is None:
+            candidates = np.arange(self.size)
+            scores = self.embeddings[:self.size] @ query
+        else:
+            candidates = np.asarray(rows)
+            scores = self.embeddings[candidates] @ query
+        
+        k = min(limit, count)
+        top = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+        top = top[np.argsort(-scores[top])]
+        return [self.ids[row] for row in candidates[top]]
 
-def store_in_firestore(data: dict) -> str:
-    """Store receipt data in Firestore with user identification"""
+vector_index = VectorIndex()
+
+async def load_vector_index():
+    """Stream stored embeddings from the vector_index collection into memory.
+    
+    After the first load only documents created since the previous load are read,
+    which picks up embeddings stored by other worker processes.
+    """
+    if not db:
+        return
+    
+    started_at = datetime.now(timezone.utc)
+    query = db.collection('vector_index')
+    if vector_index.loaded_until:
+        query = query.where('created_at', '>=', vector_index.loaded_until - VECTOR_INDEX_REFRESH_OVERLAP)
+    
+    with FIRESTORE_LATENCY.labels("load_vector_index").time():
+        async for doc in query.select(['user_id', 'embeddings']).stream():
+            data = doc.to_dict()
+            if data.get('embeddings'):
+                vector_index.add(doc.id, data['embeddings'], data.get('user_id'))
+    
+    if vector_index.loaded_until is None:
+        logger.info(f"Vector index loaded with {vector_index.size} embeddings")
+    vector_index.loaded_until = started_at
+
+async def refresh_vector_index():
+    """Incrementally reload the vector index at most once per refresh interval"""
+    if time.monotonic() - vector_index.refreshed_at < VECTOR_INDEX_REFRESH_SECONDS:
+        return
+    vector_index.refreshed_at = time.monotonic()
+    
     try:
-        if not db:
-            raise Exception("Firestore client not initialized")
-        
-        # Generate unique document ID
-        document_id = str(uuid.uuid4())
-        
-        # Add metadata including user identification
-        document_data = {
-            **data,
-            "created_at": datetime.now(),
-            "updated_at": datetime.now(),
-            "id": document_id,
-            "user_id": data.get("user_id"),  # Store Gmail ID as user identifier
-            "data_type": "receipt"
-        }
-        
-        # Store in receipts collection with user-specific organization
-        doc_ref = db.collection('receipts').document(document_id)
-        doc_ref.set(document_data)
-        
-        # Also create a user-specific subcollection for easier querying
-        user_id = data.get("user_id")
-        if user_id:
-            user_receipt_ref = db.collection('users').document(user_id).collection('receipts').document(document_id)
-            user_receipt_ref.set({
-                "receipt_id": document_id,
-                "created_at": datetime.now(),
-                "vendor_name": data.get("vendor_name"),
-                "total_amount": data.get("total_amount"),
-                "bill_category": data.get("bill_category"),
-                "date": data.get("date")
-            })
-        
-        logger.info(f"Document stored in Firestore with ID: {document_id} for user: {user_id}")
-        return document_id
-        
+        await load_vector_index()
     except Exception as e:
-        logger.error(f"Error storing data in Firestore: {str(e)}")
-        raise
+        logger.error(f"Failed to refresh vector index: {str(e)}")
+
+async def fetch_receipts_by_ids(document_ids: List[str]) -> List[Dict[str, Any]]:
+    """Fetch receipts in one batched read, preserving the given ranking order"""
+    if not document_ids:
+        return []
+    
+    refs = [db.collection('receipts').document(document_id) for document_id in document_ids]
+    receipts = {}
+    with FIRESTORE_LATENCY.labels("get_all").time():
+        async for doc in db.get_all(refs):
+            if doc.exists:
+                receipt_data = doc.to_dict()
+                receipt_data.pop('embeddings', None)  # Remove embeddings from results
+                receipts[doc.id] = receipt_data
+    
+    return [receipts[document_id] for document_id in document_ids if document_id in receipts]
 
-def store_embeddings_in_vector_db(document_id: str, embeddings: List[float], metadata: dict, user_id: str):
-    """Store embeddings in Vector DB with user identification metadata"""
+# Rendered receipt bodies and ETags keyed by document ID
+receipt_cache = TTLCache(maxsize=RECEIPT_CACHE_MAXSIZE, ttl=RECEIPT_CACHE_TTL_SECONDS)
+
+def receipt_etag(receipt: dict, body: bytes) -> str:
+    """Build a strong ETag from the receipt's updated_at, falling back to the rendered body"""
+    updated_at = receipt.get("updated_at")
+    source = updated_at.isoformat().encode() if isinstance(updated_at, datetime) else body
+    return f'"{hashlib.sha1(source).hexdigest()[:16]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def date_to_epoch(date_str: Optional[str]) -> Optional[int]:
+    """Convert a YYYY-MM-DD date string to UTC epoch seconds for range queries"""
+    if not date_str:
+        return None
+    try:
+        return int(datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+def build_receipt_document(data: dict) -> dict:
+    """Build the receipt document with user identification metadata"""
+    # Generate unique document ID
+    document_id = str(uuid.uuid4())
+    
+    # Add metadata including user identification
+    return {
+        **data,
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+        "id": document_id,
+        "user_id": data.get("user_id"),  # Store Gmail ID as user identifier
+        "date_epoch": date_to_epoch(data.get("date")),  # Numeric date for indexed range filters
+        "data_type": "receipt"
+    }
+
+def build_embedding_documents(document_id: str, embeddings: List[float], metadata: dict, user_id: str) -> tuple:
+    """Build the receipt embedding fields and the vector index document"""
+    # For this example, we'll store embeddings back in Firestore with the document
+    # In production, you'd use Vertex AI Vector Search or another vector database
+    
+    # Enhanced metadata with user identification for vector search
+    enhanced_metadata = {
+        **metadata,
+        "user_id": user_id,  # Gmail ID for user-specific vector searches
+        "document_id": document_id,
+        "vector_db_created_at": datetime.now().isoformat(),
+        "searchable_by_user": user_id,  # For user-specific vector filtering
+        "data_source": "receipt_processing"
+    }
+    
+    embedding_fields = {
+        "embeddings": embeddings,
+        "embedding_metadata": enhanced_metadata,
+        "embeddings_created_at": datetime.now(),
+        "vector_search_enabled": True
+    }
+    
+    # Stored in a separate vector index collection for efficient vector searches
+    vector_document = {
+        "user_id": user_id,
+        "document_id": document_id,
+        "embeddings": embeddings,
+        "metadata": enhanced_metadata,
+        # UTC-aware so the incremental refresh's created_at >= loaded_until comparison is consistent
+        "created_at": datetime.now(timezone.utc)
+    }
+    
+    return embedding_fields, vector_document
+
+def stage_receipt_writes(batch, document_data: dict, vector_document: Optional[dict] = None, pass_record: Optional[dict] = None) -> int:
+    """Add the receipt, its embeddings and wallet pass record to a write batch, returning the write count"""
+    document_id = document_data["id"]
+    user_id = document_data.get("user_id")
+    writes = 1
+    
+    # Store in receipts collection with user-specific organization
+    batch.set(db.collection('receipts').document(document_id), document_data)
+    
+    # Also create a user-specific subcollection for easier querying
+    if user_id:
+        user_receipt_ref = db.collection('users').document(user_id).collection('receipts').document(document_id)
+        batch.set(user_receipt_ref, {
+            "receipt_id": document_id,
+            "created_at": datetime.now(),
+            "vendor_name": document_data.get("vendor_name"),
+            "total_amount": document_data.get("total_amount"),
+            "bill_category": document_data.get("bill_category"),
+            "date": document_data.get("date")
+        })
+        writes += 1
+    
+    if vector_document:
+        batch.set(db.collection('vector_index').document(document_id), vector_document)
+        writes += 1
+    
+    # Store pass information in Firestore for user tracking
+    if pass_record:
+        batch.set(db.collection('user_wallet_passes').document(pass_record["pass_id"]), pass_record)
+        writes += 1
+    
+    return writes
+
+async def store_in_firestore(document_data: dict, vector_document: Optional[dict] = None, pass_record: Optional[dict] = None) -> str:
+    """Store the receipt, its embeddings and wallet pass record in a single batched commit"""
     try:
-        # For this example, we'll store embeddings back in Firestore with the document
-        # In production, you'd use Vertex AI Vector Search or another vector database
-        
         if not db:
             raise Exception("Firestore client not initialized")
         
-        # Enhanced metadata with user identification for vector search
-        enhanced_metadata = {
-            **metadata,
-            "user_id": user_id,  # Gmail ID for user-specific vector searches
-            "document_id": document_id,
-            "vector_db_created_at": datetime.now().isoformat(),
-            "searchable_by_user": user_id,  # For user-specific vector filtering
-            "data_source": "receipt_processing"
-        }
+        batch = db.batch()
+        stage_receipt_writes(batch, document_data, vector_document, pass_record)
+        async with firestore_commit_semaphore:
+            with FIRESTORE_LATENCY.labels("commit").time():
+                await batch.commit()
         
-        # Update the document with embeddings and enhanced metadata
-        doc_ref = db.collection('receipts').document(document_id)
-        doc_ref.update({
-            "embeddings": embeddings,
-            "embedding_metadata": enhanced_metadata,
-            "embeddings_created_at": datetime.now(),
-            "vector_search_enabled": True
-        })
+        document_id = document_data["id"]
+        user_id = document_data.get("user_id")
+        if vector_document:
+            vector_index.add(document_id, vector_document["embeddings"], user_id)
         
-        # Store in a separate vector index collection for efficient vector searches
-        vector_doc_ref = db.collection('vector_index').document(document_id)
-        vector_doc_ref.set({
-            "user_id": user_id,
-            "document_id": document_id,
-            "embeddings": embeddings,
-            "metadata": enhanced_metadata,
-            "created_at": datetime.now()
-        })
-        
-        logger.info(f"Embeddings stored for document: {document_id} with user_id: {user_id}")
+        logger.info(f"Document stored in Firestore with ID: {document_id} for user: {user_id}")
+        return document_id
         
     except Exception as e:
-        logger.error(f"Error storing embeddings: {str(e)}")
+        logger.error(f"Error storing data in Firestore: {str(e)}")
         raise
 
-def create_google_wallet_pass(receipt_data: dict) -> str:
-    """Create a user-specific Google Wallet pass for the receipt"""
+def create_google_wallet_pass(receipt_data: dict) -> tuple:
+    """Create a user-specific Google Wallet pass, returning (pass_url, pass_record)"""
     try:
         # Generate user-specific pass ID using user_id (Gmail ID)
         user_identifier = receipt_data.get("user_id", "anonymous")
-        user_hash = hashlib.md5(user_identifier.encode()).hexdigest()[:8]
-        pass_id = f"{user_hash}_{receipt_data.get('id', uuid.uuid4())}"
+        user_hash = blake3.blake3(user_identifier.encode()).hexdigest()[:8]
+        pass_id = f"{PASS_ID_VERSION}_{user_hash}_{receipt_data.get('id', uuid.uuid4())}"
+        # Grouping and the barcode keep the legacy MD5 hash: new passes stay grouped with a user's
+        # existing ones, and scanners/lookups keyed on the old barcode value keep working
+        legacy_user_hash = hashlib.md5(user_identifier.encode()).hexdigest()[:8]
         
         # Create user-specific pass data
         pass_data = {
@@ -280,7 +594,7 @@ def create_google_wallet_pass(receipt_data: dict) -> str:
                     },
                     # User-specific grouping and personalization
                     "groupingInfo": {
-                        "groupingId": f"user-receipts-{user_hash}",
+                        "groupingId": f"user-receipts-{legacy_user_hash}",
                         "sortIndex": int(datetime.now().timestamp())
                     },
                     # Add user context in pass
@@ -303,7 +617,7 @@ def create_google_wallet_pass(receipt_data: dict) -> str:
             # Add user-specific barcode for tracking
             pass_data["payload"]["genericObjects"][0]["barcode"] = {
                 "type": "QR_CODE",
-                "value": f"receipt:{receipt_data.get('id')}:user:{user_hash}",
+                "value": f"receipt:{receipt_data.get('id')}:user:{legacy_user_hash}",
                 "alternateText": f"Receipt {receipt_data.get('id', 'N/A')[:8]}"
             }
         
@@ -325,47 +639,203 @@ def create_google_wallet_pass(receipt_data: dict) -> str:
         encoded_pass = base64.urlsafe_b64encode(json.dumps(pass_data).encode()).decode()
         pass_url = f"https://pay.google.com/gp/v/save/{encoded_pass}"
         
-        # Store pass information in Firestore for user tracking
-        if db and receipt_data.get("user_id"):
-            pass_ref = db.collection('user_wallet_passes').document(pass_id)
-            pass_ref.set({
+        # Pass information is stored alongside the receipt for user tracking
+        pass_record = None
+        if receipt_data.get("user_id"):
+            pass_record = {
                 "user_id": receipt_data["user_id"],  # Store Gmail ID as user_id
                 "receipt_id": receipt_data.get("id"),
                 "pass_id": pass_id,
                 "pass_url": pass_url,
                 "created_at": datetime.now(),
                 "status": "active"
-            })
+            }
         
         logger.info(f"User-specific Google Wallet pass created for user: {user_identifier[:20]}...")
-        return pass_url
+        return pass_url, pass_record
         
     except Exception as e:
         logger.error(f"Error creating user-specific Google Wallet pass: {str(e)}")
-        return None
+        return None, None
+
+# Upper bound on the page size the cursor-paginated endpoints accept
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(doc) -> str:
+    """Encode a document's (created_at, id) sort key as an opaque pagination cursor"""
+    created_at = doc.to_dict().get("created_at")
+    payload = {
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        "id": doc.id
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a pagination cursor into start_after() field values"""
+    payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return {
+        "created_at": datetime.fromisoformat(payload["created_at"]),
+        "__name__": payload["id"]
+    }
+
+def order_newest_first(query):
+    """Order a query by created_at DESC with the document ID as a stable tie-break"""
+    return (
+        query.order_by('created_at', direction=firestore.Query.DESCENDING)
+        .order_by(FieldPath.document_id(), direction=firestore.Query.DESCENDING)
+    )
+
+async def paginate_query(query, page_size: int, start_after: Optional[dict] = None):
+    """Yield (docs, next_cursor) pages of a query ordered newest first.
+    
+    Each page resumes from the previous page's last (created_at, id), so page N
+    costs page_size reads instead of re-reading every earlier page.
+    """
+    query = order_newest_first(query)
+    while True:
+        page_query = query.start_after(start_after) if start_after else query
+        with FIRESTORE_LATENCY.labels("query").time():
+            docs = await page_query.limit(page_size).get()
+        next_cursor = encode_cursor(docs[-1]) if len(docs) == page_size else None
+        yield docs, next_cursor
+        if not next_cursor:
+            return
+        start_after = decode_cursor(next_cursor)
+
+async def stream_receipts_ndjson(query, page_size: int, start_after: Optional[dict] = None):
+    """Yield one page of receipts as NDJSON lines, then a trailing line with count and next_cursor"""
+    page_query = order_newest_first(query)
+    if start_after:
+        page_query = page_query.start_after(start_after)
+    
+    count = 0
+    last_doc = None
+    async for doc in page_query.limit(page_size).stream():
+        receipt_data = doc.to_dict()
+        # Remove embeddings from list view for performance
+        receipt_data.pop('embeddings', None)
+        count += 1
+        last_doc = doc
+        yield orjson.dumps(receipt_data, default=orjson_default, option=ORJSON_OPTIONS) + b"\n"
+    
+    next_cursor = encode_cursor(last_doc) if count == page_size else None
+    yield orjson.dumps({"count": count, "limit": page_size, "next_cursor": next_cursor}) + b"\n"
+
+class CachedJSONBody:
+    """JSON response body rebuilt at most once per refresh interval"""
+    
+    def __init__(self, build, refresh_seconds: float = 1.0):
+        self.build = build
+        self.refresh_seconds = refresh_seconds
+        self._body: Optional[bytes] = None
+        self._built_at = 0.0
+    
+    def get(self) -> bytes:
+        now = time.monotonic()
+        if self._body is None or now - self._built_at >= self.refresh_seconds:
+            self._body = orjson.dumps(self.build())
+            self._built_at = now
+        return self._body
+
+root_body = CachedJSONBody(lambda: {
+    "message": "Receipt Storage and Wallet API is running",
+    "status": "healthy",
+    "services": {
+        "firestore": db is not None,
+        "google_ai": GOOGLE_API_KEY is not None,
+        "project_id": GOOGLE_PROJECT_ID is not None
+    }
+})
+
+health_body = CachedJSONBody(lambda: {
+    "status": "healthy",
+    "service": "receipt-storage-wallet-api",
+    "timestamp": datetime.now().isoformat()
+})
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
-    return {
-        "message": "Receipt Storage and Wallet API is running",
-        "status": "healthy",
-        "services": {
-            "firestore": db is not None,
-            "google_ai": GOOGLE_API_KEY is not None,
-            "project_id": GOOGLE_PROJECT_ID is not None
-        }
-    }
+    return Response(content=root_body.get(), media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Cloud Run"""
+    return Response(content=health_body.get(), media_type="application/json")
+
+async def prepare_receipt(receipt_data: ReceiptData) -> dict:
+    """Build the receipt, embedding and wallet pass documents in memory without writing them"""
+    # Convert to dict for processing
+    data_dict = receipt_data.model_dump(mode="json")
+    
+    # Build the receipt document in memory; the caller writes everything in one batch
+    document_data = build_receipt_document(data_dict)
+    document_id = document_data["id"]
+    vector_document = None
+    
+    # Generate embeddings with error handling
+    embedding_stored = False
+    ai_processing_status = "failed"
+    try:
+        text_for_embedding = json.dumps(data_dict, default=str)
+        embeddings, embedding_model_name = await generate_embeddings(text_for_embedding)
+        
+        # Store embeddings with user identification
+        embedding_metadata = {
+            "model": embedding_model_name,
+            "dimensions": len(embeddings),
+            "created_at": datetime.now().isoformat(),
+            "receipt_category": data_dict.get("bill_category"),
+            "vendor_name": data_dict.get("vendor_name")
+        }
+        
+        embedding_fields, vector_document = build_embedding_documents(document_id, embeddings, embedding_metadata, receipt_data.user_id)
+        document_data.update(embedding_fields)
+        embedding_stored = True
+        ai_processing_status = "completed"
+        logger.info(f"AI processing completed successfully for user: {receipt_data.user_id}")
+        
+    except Exception as ai_error:
+        logger.error(f"AI processing failed: {str(ai_error)}")
+        ai_processing_status = f"failed: {str(ai_error)}"
+        # Continue with wallet pass creation even if AI processing fails
+    
+    # Create Google Wallet pass before the commit so its URL is stored with the receipt
+    data_dict["id"] = document_id
+    wallet_pass_url, pass_record = create_google_wallet_pass(data_dict)
+    document_data["wallet_pass_url"] = wallet_pass_url
+    
     return {
-        "status": "healthy",
-        "service": "receipt-storage-wallet-api",
-        "timestamp": datetime.now().isoformat()
+        "document_data": document_data,
+        "vector_document": vector_document,
+        "pass_record": pass_record,
+        "wallet_pass_url": wallet_pass_url,
+        "embedding_stored": embedding_stored,
+        "ai_processing_status": ai_processing_status
     }
 
+def build_storage_response(prepared: dict, firestore_status: str = "stored") -> StorageResponse:
+    """Build the storage response for a prepared receipt"""
+    embedding_stored = prepared["embedding_stored"]
+    if firestore_status != "stored":
+        message = "Receipt could not be stored in Firestore"
+    elif embedding_stored:
+        message = "Receipt stored successfully with embeddings and wallet pass created"
+    else:
+        message = "Receipt stored successfully, wallet pass created (AI processing had issues)"
+    
+    # Every field is built here from trusted values, so validation is skipped
+    return StorageResponse.model_construct(
+        success=firestore_status == "stored",
+        document_id=prepared["document_data"]["id"],
+        embedding_stored=embedding_stored,
+        wallet_pass_url=prepared["wallet_pass_url"],
+        message=message,
+        timestamp=datetime.now().isoformat(),
+        firestore_status=firestore_status,
+        ai_processing_status=prepared["ai_processing_status"]
+    )
+
 @app.post("/store-receipt", response_model=StorageResponse)
 async def store_receipt(receipt_data: ReceiptData):
     """
@@ -396,55 +866,14 @@ async def store_receipt(receipt_data: ReceiptData):
                 detail="user_id (Gmail ID) is required for receipt storage"
             )
         
-        # Convert to dict for processing
-        data_dict = receipt_data.dict()
-        
-        # Store in Firestore
-        document_id = store_in_firestore(data_dict)
-        firestore_status = "stored"
-        
-        # Generate embeddings with error handling
-        embedding_stored = False
-        ai_processing_status = "failed"
-        try:
-            text_for_embedding = json.dumps(data_dict, default=str)
-            embeddings = generate_embeddings(text_for_embedding)
-            
-            # Store embeddings with user identification
-            embedding_metadata = {
-                "model": "custom-hash-based",
-                "dimensions": len(embeddings),
-                "created_at": datetime.now().isoformat(),
-                "receipt_category": data_dict.get("bill_category"),
-                "vendor_name": data_dict.get("vendor_name")
-            }
-            
-            store_embeddings_in_vector_db(document_id, embeddings, embedding_metadata, receipt_data.user_id)
-            embedding_stored = True
-            ai_processing_status = "completed"
-            logger.info(f"AI processing completed successfully for user: {receipt_data.user_id}")
-            
-        except Exception as ai_error:
-            logger.error(f"AI processing failed: {str(ai_error)}")
-            ai_processing_status = f"failed: {str(ai_error)}"
-            # Continue with wallet pass creation even if AI processing fails
+        prepared = await prepare_receipt(receipt_data)
         
-        # Create Google Wallet pass
-        data_dict["id"] = document_id
-        wallet_pass_url = create_google_wallet_pass(data_dict)
+        # Store receipt, embeddings and wallet pass in Firestore with a single commit
+        await store_in_firestore(prepared["document_data"], prepared["vector_document"], prepared["pass_record"])
         
         logger.info("Receipt processed and stored successfully")
         
-        return StorageResponse(
-            success=True,
-            document_id=document_id,
-            embedding_stored=embedding_stored,
-            wallet_pass_url=wallet_pass_url,
-            message="Receipt stored successfully with embeddings and wallet pass created" if embedding_stored else "Receipt stored successfully, wallet pass created (AI processing had issues)",
-            timestamp=datetime.now().isoformat(),
-            firestore_status=firestore_status,
-            ai_processing_status=ai_processing_status
-        )
+        return FirestoreJSONResponse(content=build_storage_response(prepared).model_dump())
         
     except HTTPException:
         raise
@@ -455,20 +884,112 @@ async def store_receipt(receipt_data: ReceiptData):
             detail=f"Internal server error: {str(e)}"
         )
 
-@app.get("/receipt/{document_id}")
-async def get_receipt(document_id: str):
-    """Retrieve a receipt by document ID"""
+@app.post("/store-receipts:batch", response_model=List[StorageResponse])
+async def store_receipts_batch(receipts: List[ReceiptData]):
+    """
+    Store many receipts in one request, returning one StorageResponse per receipt in input order
+    
+    - **receipts**: List of receipt data in JSON format
+    """
     try:
+        # Validate required services
         if not db:
             raise HTTPException(status_code=500, detail="Firestore not configured")
         
-        doc_ref = db.collection('receipts').document(document_id)
-        doc = doc_ref.get()
+        if not GOOGLE_API_KEY:
+            raise HTTPException(status_code=500, detail="Google AI API not configured")
+        
+        if len(receipts) > MAX_BATCH_RECEIPTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"A batch may contain at most {MAX_BATCH_RECEIPTS} receipts"
+            )
+        
+        if any(not receipt_data.user_id for receipt_data in receipts):
+            raise HTTPException(
+                status_code=400,
+                detail="user_id (Gmail ID) is required for every receipt in the batch"
+            )
+        
+        logger.info(f"Processing batch storage request for {len(receipts)} receipts")
+        
+        # Prepare receipts concurrently so their embedding requests share Vertex AI batches
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        
+        async def prepare_with_limit(receipt_data: ReceiptData) -> dict:
+            async with semaphore:
+                return await prepare_receipt(receipt_data)
+        
+        prepared_receipts = await asyncio.gather(*[prepare_with_limit(receipt_data) for receipt_data in receipts])
+        
+        # Commit in chunks that stay under Firestore's per-batch write limit
+        receipts_per_commit = FIRESTORE_BATCH_WRITE_LIMIT // MAX_WRITES_PER_RECEIPT
+        chunks = [prepared_receipts[i:i + receipts_per_commit] for i in range(0, len(prepared_receipts), receipts_per_commit)]
         
-        if not doc.exists:
-            raise HTTPException(status_code=404, detail="Receipt not found")
+        async def commit_chunk(chunk: List[dict]):
+            batch = db.batch()
+            for prepared in chunk:
+                stage_receipt_writes(batch, prepared["document_data"], prepared["vector_document"], prepared["pass_record"])
+            async with firestore_commit_semaphore:
+                with FIRESTORE_LATENCY.labels("commit").time():
+                    await batch.commit()
         
-        return doc.to_dict()
+        commit_results = await asyncio.gather(*[commit_chunk(chunk) for chunk in chunks], return_exceptions=True)
+        
+        responses = []
+        for chunk, commit_error in zip(chunks, commit_results):
+            if commit_error:
+                logger.error(f"Error committing receipt batch: {str(commit_error)}")
+            
+            for prepared in chunk:
+                if commit_error:
+                    responses.append(build_storage_response(prepared, firestore_status=f"failed: {str(commit_error)}"))
+                    continue
+                
+                if prepared["vector_document"]:
+                    vector_index.add(prepared["document_data"]["id"], prepared["vector_document"]["embeddings"], prepared["document_data"]["user_id"])
+                responses.append(build_storage_response(prepared))
+        
+        logger.info(f"Batch of {len(receipts)} receipts processed in {len(chunks)} commits")
+        return FirestoreJSONResponse(content=[response.model_dump() for response in responses])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error storing receipt batch: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+@app.get("/receipt/{document_id}", response_class=FirestoreJSONResponse)
+async def get_receipt(document_id: str, if_none_match: Optional[str] = Header(None)):
+    """Retrieve a receipt by document ID (cached, with ETag revalidation)"""
+    try:
+        if not db:
+            raise HTTPException(status_code=500, detail="Firestore not configured")
+        
+        cached = receipt_cache.get(document_id)
+        if cached is None:
+            doc_ref = db.collection('receipts').document(document_id)
+            with FIRESTORE_LATENCY.labels("get").time():
+                doc = await doc_ref.get()
+            
+            if not doc.exists:
+                raise HTTPException(status_code=404, detail="Receipt not found")
+            
+            receipt = doc.to_dict()
+            body = orjson.dumps(receipt, default=orjson_default, option=ORJSON_OPTIONS)
+            cached = (body, receipt_etag(receipt, body))
+            receipt_cache[document_id] = cached
+        
+        body, etag = cached
+        headers = {"Cache-Control": RECEIPT_CACHE_CONTROL, "ETag": etag}
+        
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        
+        return Response(content=body, media_type="application/json", headers=headers)
         
     except HTTPException:
         raise
@@ -476,23 +997,28 @@ async def get_receipt(document_id: str):
         logger.error(f"Error retrieving receipt: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/receipts")
-async def list_receipts(limit: int = 10, offset: int = 0):
-    """List receipts with pagination"""
+@app.get("/receipts", response_class=FirestoreJSONResponse)
+async def list_receipts(limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """List receipts with cursor-based pagination (pass next_cursor back as cursor).
+    
+    With `Accept: application/x-ndjson` receipts are streamed as they are read,
+    followed by a final line holding count, limit and next_cursor.
+    """
     try:
         if not db:
             raise HTTPException(status_code=500, detail="Firestore not configured")
         
-        query = db.collection('receipts').order_by('created_at', direction=firestore.Query.DESCENDING)
+        try:
+            start_after = decode_cursor(cursor) if cursor else None
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+        
+        query = db.collection('receipts')
         
-        if offset > 0:
-            # Get the document at offset position for pagination
-            offset_docs = query.limit(offset).get()
-            if offset_docs:
-                last_doc = offset_docs[-1]
-                query = query.start_after(last_doc)
+        if accept and NDJSON_MEDIA_TYPE in accept:
+            return StreamingResponse(stream_receipts_ndjson(query, limit, start_after), media_type=NDJSON_MEDIA_TYPE)
         
-        docs = query.limit(limit).get()
+        docs, next_cursor = await anext(paginate_query(query, limit, start_after))
         
         receipts = []
         for doc in docs:
@@ -501,54 +1027,49 @@ async def list_receipts(limit: int = 10, offset: int = 0):
             receipt_data.pop('embeddings', None)
             receipts.append(receipt_data)
         
-        return {
+        return FirestoreJSONResponse(content={
             "receipts": receipts,
             "count": len(receipts),
-            "offset": offset,
-            "limit": limit
-        }
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing receipts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/search-receipts")
+@app.post("/search-receipts", response_class=FirestoreJSONResponse)
 async def search_receipts(query: str, limit: int = 10):
-    """Search receipts using semantic similarity (simplified version)"""
+    """Search receipts using cosine similarity over the in-memory vector index"""
     try:
         if not db:
             raise HTTPException(status_code=500, detail="Firestore not configured")
         
         # Generate embedding for search query
-        query_embedding = generate_embeddings(query)
+        query_embedding, _ = await generate_embeddings(query)
         
-        # For this demo, we'll do a simple text search
-        # In production, you'd use proper vector similarity search
-        receipts_ref = db.collection('receipts')
-        docs = receipts_ref.limit(limit).get()
+        # Rank all stored embeddings in one matrix-vector product, then fetch only the matches
+        await refresh_vector_index()
+        document_ids = vector_index.search(query_embedding, limit)
+        results = await fetch_receipts_by_ids(document_ids)
         
-        results = []
-        for doc in docs:
-            receipt_data = doc.to_dict()
-            # Simple text matching for demo
-            receipt_text = json.dumps(receipt_data, default=str).lower()
-            if query.lower() in receipt_text:
-                receipt_data.pop('embeddings', None)  # Remove embeddings from results
-                results.append(receipt_data)
-        
-        return {
+        return FirestoreJSONResponse(content={
             "query": query,
             "results": results,
             "count": len(results)
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching receipts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/search-user-receipts")
+@app.post("/search-user-receipts", response_class=FirestoreJSONResponse)
 async def search_user_receipts(query: str, user_id: str, limit: int = 10):
-    """Search receipts for a specific user using semantic similarity"""
+    """Search receipts for a specific user using cosine similarity"""
     try:
         if not db:
             raise HTTPException(status_code=500, detail="Firestore not configured")
@@ -557,36 +1078,27 @@ async def search_user_receipts(query: str, user_id: str, limit: int = 10):
             raise HTTPException(status_code=400, detail="user_id is required")
         
         # Generate embedding for search query
-        query_embedding = generate_embeddings(query)
-        
-        # Search only user's receipts
-        receipts_ref = db.collection('receipts').where('user_id', '==', user_id)
-        docs = receipts_ref.limit(limit * 2).get()  # Get more docs for better filtering
-        
-        results = []
-        for doc in docs:
-            receipt_data = doc.to_dict()
-            # Simple text matching for demo - in production use vector similarity
-            receipt_text = json.dumps(receipt_data, default=str).lower()
-            if query.lower() in receipt_text:
-                receipt_data.pop('embeddings', None)  # Remove embeddings from results
-                results.append(receipt_data)
+        query_embedding, _ = await generate_embeddings(query)
         
-        # Limit results
-        results = results[:limit]
+        # Score only this user's rows of the vector index
+        await refresh_vector_index()
+        document_ids = vector_index.search(query_embedding, limit, user_id=user_id)
+        results = await fetch_receipts_by_ids(document_ids)
         
-        return {
+        return FirestoreJSONResponse(content={
             "query": query,
             "user_id": user_id,
             "results": results,
             "count": len(results)
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching user receipts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/user-receipts/{user_id}")
+@app.get("/user-receipts/{user_id}", response_class=FirestoreJSONResponse)
 async def get_user_receipts(user_id: str, limit: int = 50, offset: int = 0):
     """Get all receipts for a specific user"""
     try:
@@ -598,7 +1110,8 @@ async def get_user_receipts(user_id: str, limit: int = 50, offset: int = 0):
         
         # Query user's receipts
         receipts_ref = db.collection('receipts').where('user_id', '==', user_id)
-        docs = receipts_ref.limit(limit).offset(offset).get()
+        with FIRESTORE_LATENCY.labels("query").time():
+            docs = await receipts_ref.limit(limit).offset(offset).get()
         
         receipts = []
         for doc in docs:
@@ -607,43 +1120,46 @@ async def get_user_receipts(user_id: str, limit: int = 50, offset: int = 0):
             receipt_data.pop('embeddings', None)
             receipts.append(receipt_data)
         
-        return {
+        return FirestoreJSONResponse(content={
             "user_id": user_id,
             "receipts": receipts,
             "count": len(receipts),
             "offset": offset,
             "limit": limit
-        }
+        })
         
     except Exception as e:
         logger.error(f"Error retrieving user receipts: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/user-wallet-passes/{user_id}")
-async def get_user_wallet_passes(user_id: str):
-    """Get all wallet passes for a specific user"""
+@app.get("/user-wallet-passes/{user_id}", response_class=FirestoreJSONResponse)
+async def get_user_wallet_passes(user_id: str, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Get a user's wallet passes, newest first, with cursor-based pagination"""
     try:
         if not db:
             raise HTTPException(status_code=500, detail="Firestore not configured")
         
-        passes_ref = db.collection('user_wallet_passes')
-        query = passes_ref.where('user_id', '==', user_id)
-        docs = query.get()
+        try:
+            start_after = decode_cursor(cursor) if cursor else None
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
         
-        passes = []
-        for doc in docs:
-            pass_data = doc.to_dict()
-            passes.append(pass_data)
+        # Ordered and limited by Firestore using the (user_id, created_at DESC) composite index
+        query = db.collection('user_wallet_passes').where('user_id', '==', user_id)
+        docs, next_cursor = await anext(paginate_query(query, limit, start_after))
         
-        # Sort by created_at in Python since Firestore ordering requires an index
-        passes.sort(key=lambda x: x.get('created_at', datetime.min), reverse=True)
+        passes = [doc.to_dict() for doc in docs]
         
-        return {
+        return FirestoreJSONResponse(content={
             "user_id": user_id,
             "wallet_passes": passes,
-            "count": len(passes)
-        }
+            "count": len(passes),
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving user wallet passes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -651,4 +1167,14 @@ async def get_user_wallet_passes(user_id: str):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8081))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Start from an empty metrics directory so samples from a previous run aren't aggregated in
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1"))
+    )
@@ -3,9 +3,12 @@
 Quick manual test for debugging AI processing issues
 """
 
-import requests
+from http_session import create_session
 import json
 
+# Keep-alive session reused by every request in this script
+session = create_session()
+
 # Test just the essential functionality
 def test_basic_functionality():
     print("🔧 Testing Basic API Functionality")
@@ -16,7 +19,7 @@ def test_basic_functionality():
     # 1. Health Check
     print("\n1. Testing Health Check...")
     try:
-        response = requests.get(f"{base_url}/")
+        response = session.get(f"{base_url}/")
         if response.status_code == 200:
             data = response.json()
             services = data.get('services', {})
@@ -44,9 +47,8 @@ def test_basic_functionality():
     }
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{base_url}/store-receipt",
-            headers={"Content-Type": "application/json"},
             json=simple_receipt
         )
         
@@ -81,7 +83,10 @@ if __name__ == "__main__":
     print("\nMake sure the server is running: python main.py")
     input("Press Enter to continue...")
     
-    test_basic_functionality()
+    try:
+        test_basic_functionality()
+    finally:
+        session.close()
     
     print("\n" + "=" * 50)
     print("🏁 Quick test completed!")
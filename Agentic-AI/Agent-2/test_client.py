@@ -3,11 +3,13 @@
 Test client for Receipt Storage and Wallet API
 """
 
-import requests
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
+from http_session import close_sessions, get_session
+
 # Configuration
 BASE_URL = "http://localhost:8081"  # Change to your deployed URL
 # BASE_URL = "https://your-service-url.run.app"
@@ -16,7 +18,7 @@ def test_health_check():
     """Test the health check endpoint"""
     print("🏥 Testing health check...")
     try:
-        response = requests.get(f"{BASE_URL}/")
+        response = get_session().get(f"{BASE_URL}/")
         print(f"Status: {response.status_code}")
         print(f"Response: {json.dumps(response.json(), indent=2)}")
         return response.status_code == 200
@@ -59,10 +61,9 @@ def test_store_receipt():
     }
     
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{BASE_URL}/store-receipt",
-            json=receipt_data,
-            headers={"Content-Type": "application/json"}
+            json=receipt_data
         )
         
         print(f"Status: {response.status_code}")
@@ -88,7 +89,7 @@ def test_get_receipt(document_id: str):
     print(f"\n📄 Testing receipt retrieval for ID: {document_id}")
     
     try:
-        response = requests.get(f"{BASE_URL}/receipt/{document_id}")
+        response = get_session().get(f"{BASE_URL}/receipt/{document_id}")
         
         print(f"Status: {response.status_code}")
         
@@ -112,7 +113,7 @@ def test_list_receipts():
     print("\n📋 Testing receipt listing...")
     
     try:
-        response = requests.get(f"{BASE_URL}/receipts?limit=5")
+        response = get_session().get(f"{BASE_URL}/receipts?limit=5")
         
         print(f"Status: {response.status_code}")
         
@@ -139,7 +140,7 @@ def test_search_receipts():
     search_query = "MacBook"
     
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{BASE_URL}/search-receipts",
             params={"query": search_query, "limit": 5}
         )
@@ -184,17 +185,21 @@ def run_tests():
     # Wait a bit for the document to be stored
     time.sleep(2)
     
-    # Test retrieving the receipt
-    test_get_receipt(document_id)
-    
-    # Test listing receipts
-    test_list_receipts()
-    
-    # Test searching receipts
-    test_search_receipts()
+    # Retrieve, list and search are independent reads: run them concurrently, one session per worker thread
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(test_get_receipt, document_id),
+            executor.submit(test_list_receipts),
+            executor.submit(test_search_receipts)
+        ]
+        for future in futures:
+            future.result()
     
     print("\n" + "=" * 50)
     print("🎉 All tests completed!")
 
 if __name__ == "__main__":
-    run_tests()
+    try:
+        run_tests()
+    finally:
+        close_sessions()
@@ -5,6 +5,7 @@ Tests all endpoints and error conditions
 """
 
 import requests
+from http_session import create_session
 import json
 import time
 from datetime import datetime
@@ -12,7 +13,6 @@ import sys
 
 # API Configuration
 BASE_URL = "http://localhost:8081"
-HEADERS = {"Content-Type": "application/json"}
 
 # Test Data
 SAMPLE_RECEIPT = {
@@ -41,6 +41,9 @@ SAMPLE_RECEIPT_NO_EMAIL = {
     "bill_category": "Shopping"
 }
 
+# Keep-alive session reused by every request in this script
+session = create_session()
+
 def print_test_header(test_name):
     """Print formatted test header"""
     print(f"\n{'='*60}")
@@ -61,7 +64,7 @@ def test_health_check():
     
     try:
         # Test root endpoint
-        response = requests.get(f"{BASE_URL}/")
+        response = session.get(f"{BASE_URL}/")
         if response.status_code == 200:
             data = response.json()
             print_result(True, "Root endpoint accessible", f"Status: {data.get('status')}")
@@ -76,7 +79,7 @@ def test_health_check():
             print_result(False, "Root endpoint failed", f"Status: {response.status_code}")
         
         # Test health endpoint
-        response = requests.get(f"{BASE_URL}/health")
+        response = session.get(f"{BASE_URL}/health")
         if response.status_code == 200:
             print_result(True, "Health endpoint accessible")
         else:
@@ -96,9 +99,8 @@ def test_store_receipt_with_email():
     print_test_header("Store Receipt with User Email")
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{BASE_URL}/store-receipt",
-            headers=HEADERS,
             json=SAMPLE_RECEIPT
         )
         
@@ -129,9 +131,8 @@ def test_store_receipt_without_email():
     print_test_header("Store Receipt without User Email")
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{BASE_URL}/store-receipt",
-            headers=HEADERS,
             json=SAMPLE_RECEIPT_NO_EMAIL
         )
         
@@ -157,7 +158,7 @@ def test_get_receipt(document_id):
         return
     
     try:
-        response = requests.get(f"{BASE_URL}/receipt/{document_id}")
+        response = session.get(f"{BASE_URL}/receipt/{document_id}")
         
         if response.status_code == 200:
             data = response.json()
@@ -178,7 +179,7 @@ def test_list_receipts():
     print_test_header("List Receipts")
     
     try:
-        response = requests.get(f"{BASE_URL}/receipts?limit=5")
+        response = session.get(f"{BASE_URL}/receipts?limit=5")
         
         if response.status_code == 200:
             data = response.json()
@@ -199,9 +200,8 @@ def test_search_receipts():
     
     try:
         # Search for coffee
-        response = requests.post(
-            f"{BASE_URL}/search-receipts?query=coffee&limit=5",
-            headers=HEADERS
+        response = session.post(
+            f"{BASE_URL}/search-receipts?query=coffee&limit=5"
         )
         
         if response.status_code == 200:
@@ -220,7 +220,7 @@ def test_user_wallet_passes():
     
     try:
         user_email = "test@example.com"
-        response = requests.get(f"{BASE_URL}/user-wallet-passes/{user_email}")
+        response = session.get(f"{BASE_URL}/user-wallet-passes/{user_email}")
         
         if response.status_code == 200:
             data = response.json()
@@ -242,9 +242,8 @@ def test_error_conditions():
     
     # Test invalid JSON
     try:
-        response = requests.post(
+        response = session.post(
             f"{BASE_URL}/store-receipt",
-            headers=HEADERS,
             data="invalid json"
         )
         if response.status_code in [400, 422]:
@@ -256,7 +255,7 @@ def test_error_conditions():
     
     # Test missing receipt endpoint
     try:
-        response = requests.get(f"{BASE_URL}/receipt/nonexistent-id")
+        response = session.get(f"{BASE_URL}/receipt/nonexistent-id")
         if response.status_code == 404:
             print_result(True, "Non-existent receipt properly returns 404")
         else:
@@ -270,7 +269,7 @@ def run_diagnostic_check():
     
     # Check if server is responding
     try:
-        response = requests.get(f"{BASE_URL}/", timeout=5)
+        response = session.get(f"{BASE_URL}/", timeout=5)
         health_data = response.json()
         services = health_data.get('services', {})
         
@@ -335,4 +334,7 @@ def main():
     print("4. Test the wallet pass URLs in a browser")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        session.close()
@@ -1,20 +1,24 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import json
+from pydantic import BaseModel, RootModel, field_validator
 import logging
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Union, AsyncIterator
 import asyncio
 
 # Import Firestore and Google AI dependencies
 from google.cloud import firestore
 from google.oauth2 import service_account
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
 import os
-import ast
-import re
+import copy
+import random
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from cachetools import TTLCache
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
@@ -40,6 +44,112 @@ else:
     logger.error("GOOGLE_API_KEY not found in environment variables")
     raise ValueError("GOOGLE_API_KEY is required")
 
+# Static filter-generation preamble, sent once as a system instruction instead of inside every prompt
+FILTER_SYSTEM_INSTRUCTION = """
+You are an assistant that helps generate MongoDB queries for an expense tracking app.
+
+The MongoDB collection "receipts" has documents with this schema:
+{
+  _id: ObjectId,
+  user_id: string (Gmail ID of the user),
+  vendor_name: string,
+  bill_category: string,
+  items: [string],
+  total_amount: number,
+  date: string (YYYY-MM-DD format, e.g. "2025-01-15")
+}
+
+Main categories: Grocery, Food, Travel, OTT, Fuel, Electronics, Healthcare, Fashion, Utility Bills, Entertainment, Mobile Recharge, Insurance, Education, Home Services, Others.
+
+CRITICAL SECURITY RULE:
+- The user_id MUST ALWAYS be included in the filter for data privacy and security
+- user_id is the Gmail ID of the authenticated user given with each question
+- Never generate queries without the user_id filter
+
+IMPORTANT RULES:
+1. MANDATORY: Always include the user's user_id in every filter
+2. For date ranges, use STATIC date strings in YYYY-MM-DD format only
+3. Do NOT use any function calls like datetime.now() or relativedelta()
+4. For "last month" queries, use approximate dates like "2024-12-01" to "2024-12-31"
+5. For "this month" queries, use approximate dates like "2025-01-01" to "2025-01-31"
+6. Use only these operators: $gte, $lte, $gt, $lt, $eq, $ne, $in, $nin (no $regex; match vendor_name exactly)
+7. Return ONLY a valid JSON object with simple values
+
+Examples of VALID filters for user "user@gmail.com" (notice user_id is ALWAYS present):
+{"user_id": "user@gmail.com", "bill_category": "Grocery"}
+{"user_id": "user@gmail.com", "vendor_name": "Amazon"}
+{"user_id": "user@gmail.com", "total_amount": {"$gte": 100}}
+{"user_id": "user@gmail.com", "date": {"$gte": "2024-12-01", "$lt": "2025-01-01"}}
+
+Respond ONLY with a JSON object for the MongoDB filter. The user_id field is MANDATORY.
+"""
+
+ANSWER_SYSTEM_INSTRUCTION = (
+    "You answer questions about a user's expenses using only the filtered expense data provided. "
+    "Provide a clear, concise, and user-friendly answer. If no data is found, mention that no "
+    "matching expenses were found for the query."
+)
+
+# Shared Gemini models reused by every query instead of being rebuilt per message.
+# Filter generation runs in JSON mode so the reply parses directly without fence stripping.
+FILTER_MODEL = genai.GenerativeModel(
+    "gemini-2.0-flash",
+    system_instruction=FILTER_SYSTEM_INSTRUCTION,
+    generation_config={"response_mime_type": "application/json"}
+)
+ANSWER_MODEL = genai.GenerativeModel("gemini-2.0-flash", system_instruction=ANSWER_SYSTEM_INSTRUCTION)
+
+# Cap in-flight Gemini calls so bursts of WebSocket queries queue locally instead of tripping rate limits
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# Worker threads for the blocking Firestore client calls run via asyncio.to_thread
+FIRESTORE_THREAD_POOL_SIZE = 32
+
+# Transient Gemini errors worth retrying; anything else (bad prompt, parse errors) fails fast
+RETRYABLE_GEMINI_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0, jitter: float = 0.5):
+    """Retry an async call on transient Gemini errors with exponential backoff and jitter"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(max_retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except RETRYABLE_GEMINI_ERRORS as e:
+                    if attempt == max_retries:
+                        raise
+                    delay = min(max_delay, base_delay * 2 ** attempt) * (1 + random.uniform(0, jitter))
+                    logger.warning(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        return wrapper
+    return decorator
+
+@retry_with_backoff(max_retries=3, base_delay=1.0, max_delay=30.0, jitter=0.5)
+async def generate_content_with_retry(model, prompt: str) -> str:
+    """Call Gemini and return the response text, retrying transient failures"""
+    # Held per attempt, so a call waiting out its backoff doesn't occupy a slot
+    async with gemini_semaphore:
+        response = await model.generate_content_async(prompt)
+    return response.text
+
+@retry_with_backoff(max_retries=3, base_delay=1.0, max_delay=30.0, jitter=0.5)
+async def stream_content_with_retry(model, prompt: str):
+    """Start a streaming Gemini call, retrying transient failures before the first chunk"""
+    # The slot is taken per attempt, so backoff sleeps don't hold it. On success it stays held for
+    # the stream, and the caller must release gemini_semaphore once the stream is drained.
+    await gemini_semaphore.acquire()
+    try:
+        return await model.generate_content_async(prompt, stream=True)
+    except BaseException:
+        gemini_semaphore.release()
+        raise
+
 # Initialize Firestore client
 try:
     if GOOGLE_SERVICE_ACCOUNT_PATH and os.path.exists(GOOGLE_SERVICE_ACCOUNT_PATH):
@@ -72,6 +182,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    """Size the default executor used by asyncio.to_thread for Firestore calls"""
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=FIRESTORE_THREAD_POOL_SIZE))
+
+def encode_message(message: dict) -> str:
+    """Serialize an outgoing WebSocket message with orjson"""
+    # Sent as a text frame: the browser clients JSON.parse event.data, which a binary frame would break
+    return orjson.dumps(message, default=str).decode()
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
@@ -101,22 +221,59 @@ class ConnectionManager:
         logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
 
     async def send_personal_message(self, message: dict, websocket: WebSocket):
-        try:
-            await websocket.send_text(json.dumps(message))
-        except Exception as e:
-            logger.error(f"Error sending message: {e}")
+        await self._send_encoded(encode_message(message), websocket)
 
     async def send_to_user(self, message: dict, user_id: str):
         if user_id in self.user_connections:
+            # Serialize once for all of the user's connections
+            payload = encode_message(message)
             for connection in self.user_connections[user_id]:
-                await self.send_personal_message(message, connection)
+                await self._send_encoded(payload, connection)
+
+    async def _send_encoded(self, payload: str, websocket: WebSocket):
+        try:
+            await websocket.send_text(payload)
+        except Exception as e:
+            logger.error(f"Error sending message: {e}")
 
 manager = ConnectionManager()
 
-def extract_code_block(text: str) -> str:
-    """Extract code block from Gemini response"""
-    code = re.sub(r"^```[a-zA-Z]*\s*|```$", "", text.strip(), flags=re.MULTILINE)
-    return code.strip()
+# Exact-match cache of generated filters keyed by (user_id, day, normalized query)
+FILTER_CACHE_MAXSIZE = 2048
+FILTER_CACHE_TTL_SECONDS = 3600
+filter_cache = TTLCache(maxsize=FILTER_CACHE_MAXSIZE, ttl=FILTER_CACHE_TTL_SECONDS)
+
+# Polished answers keyed by (receipt ids, normalized query); shorter-lived since receipts keep arriving
+ANSWER_CACHE_MAXSIZE = 1024
+ANSWER_CACHE_TTL_SECONDS = 120
+answer_cache = TTLCache(maxsize=ANSWER_CACHE_MAXSIZE, ttl=ANSWER_CACHE_TTL_SECONDS)
+
+def normalize_query(query: str) -> str:
+    """Normalize a natural language query for cache lookups"""
+    return " ".join(query.lower().split())
+
+# Whitelist for Gemini-generated filters; anything else falls back to the user_id-only filter
+FILTER_FIELDS = {"user_id", "vendor_name", "bill_category", "items", "total_amount", "date"}
+# Only operators convert_mongo_to_firestore_query translates; Firestore has no $regex equivalent
+FILTER_OPERATORS = {"$gte", "$lte", "$gt", "$lt", "$eq", "$ne", "$in", "$nin"}
+
+FilterScalar = Union[str, int, float, bool]
+FilterOperand = Union[FilterScalar, List[FilterScalar]]
+
+class MongoFilter(RootModel[Dict[str, Union[FilterOperand, Dict[str, FilterOperand]]]]):
+    """MongoDB-style filter restricted to known receipt fields and operators"""
+    
+    @field_validator("root")
+    @classmethod
+    def check_fields_and_operators(cls, value: Dict[str, Any]) -> Dict[str, Any]:
+        for field, condition in value.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unsupported filter field: {field}")
+            if isinstance(condition, dict):
+                unsupported = set(condition) - FILTER_OPERATORS
+                if unsupported:
+                    raise ValueError(f"Unsupported filter operators for {field}: {sorted(unsupported)}")
+        return value
 
 def enhance_filter_with_smart_dates(mongo_filter: Dict[str, Any], query: str) -> Dict[str, Any]:
     """Enhance MongoDB filter with smart date handling based on natural language"""
@@ -154,55 +311,24 @@ def enhance_filter_with_smart_dates(mongo_filter: Dict[str, Any], query: str) ->
 
 async def generate_mongo_filter(user_id: str, query: str, model) -> Dict[str, Any]:
     """Generate MongoDB filter using Gemini AI - ALWAYS filters by user_id (Gmail ID)"""
-    prompt = f"""
-You are an assistant that helps generate MongoDB queries for an expense tracking app.
-
-The MongoDB collection "receipts" has documents with this schema:
-{{
-  _id: ObjectId,
-  user_id: string (Gmail ID of the user),
-  vendor_name: string,
-  bill_category: string,
-  items: [string],
-  total_amount: number,
-  date: string (YYYY-MM-DD format, e.g. "2025-01-15")
-}}
-
-Main categories: Grocery, Food, Travel, OTT, Fuel, Electronics, Healthcare, Fashion, Utility Bills, Entertainment, Mobile Recharge, Insurance, Education, Home Services, Others.
-
-CRITICAL SECURITY RULE:
-- The user_id MUST ALWAYS be included in the filter for data privacy and security
-- user_id is the Gmail ID of the authenticated user: {user_id}
-- Never generate queries without the user_id filter
-
-IMPORTANT RULES:
-1. MANDATORY: Always include user_id: "{user_id}" in every filter
-2. For date ranges, use STATIC date strings in YYYY-MM-DD format only
-3. Do NOT use any function calls like datetime.now() or relativedelta()
-4. For "last month" queries, use approximate dates like "2024-12-01" to "2024-12-31"
-5. For "this month" queries, use approximate dates like "2025-01-01" to "2025-01-31"
-6. Use simple comparison operators: $gte, $lt, $eq, $regex
-7. Return ONLY a valid Python dictionary with simple values
-
-Examples of VALID filters (notice user_id is ALWAYS present):
-{{"user_id": "{user_id}", "bill_category": "Grocery"}}
-{{"user_id": "{user_id}", "vendor_name": {{"$regex": "Amazon", "$options": "i"}}}}
-{{"user_id": "{user_id}", "total_amount": {{"$gte": 100}}}}
-{{"user_id": "{user_id}", "date": {{"$gte": "2024-12-01", "$lt": "2025-01-01"}}}}
-
-User Gmail ID (MUST be in filter): {user_id}
+    # Relative dates ("this month") resolve against today, so the day is part of the key
+    cache_key = (user_id, datetime.now().strftime("%Y-%m-%d"), normalize_query(query))
+    cached_filter = filter_cache.get(cache_key)
+    if cached_filter is not None:
+        logger.info(f"Filter cache hit for user: {user_id}")
+        return copy.deepcopy(cached_filter)
+    
+    # Only the per-request tail is sent; the schema and rules live in the model's system instruction
+    prompt = f"""User Gmail ID (MUST be in filter): {user_id}
 Question: {query}
-
-Respond ONLY with the Python dict for the MongoDB filter. The user_id field is MANDATORY.
 """
     
     try:
-        response = model.generate_content(prompt)
-        raw_filter = extract_code_block(response.text)
+        raw_filter = await generate_content_with_retry(model, prompt)
         logger.info(f"Raw filter from Gemini: {raw_filter}")
         
-        # Parse the filter
-        mongo_filter = ast.literal_eval(raw_filter)
+        # Parse the filter as JSON and reject unknown fields or operators
+        mongo_filter = MongoFilter.model_validate(orjson.loads(raw_filter)).root
         
         # CRITICAL: Force user_id to be present for security
         mongo_filter["user_id"] = user_id
@@ -215,7 +341,9 @@ Respond ONLY with the Python dict for the MongoDB filter. The user_id field is M
         if "user_id" not in mongo_filter or mongo_filter["user_id"] != user_id:
             logger.warning("Security violation prevented: user_id missing or incorrect")
             mongo_filter["user_id"] = user_id
-            
+        
+        # Only successfully parsed filters are cached; fallbacks are retried next time
+        filter_cache[cache_key] = copy.deepcopy(mongo_filter)
         return mongo_filter
     except Exception as e:
         logger.error(f"Error generating MongoDB filter: {str(e)}")
@@ -254,48 +382,91 @@ def convert_mongo_to_firestore_query(mongo_filter: Dict[str, Any], collection_re
     
     return query
 
-async def query_firestore_receipts(firestore_filter: Dict[str, Any]) -> List[Dict]:
-    """Query receipts from Firestore using the converted filter"""
+# Only the fields polish_output needs to answer a question; skips embeddings and metadata
+RECEIPT_QUERY_FIELDS = ["vendor_name", "bill_category", "items", "total_amount", "taxes", "date", "timestamp"]
+RECEIPT_QUERY_LIMIT = 200
+
+async def query_firestore_receipts(firestore_filter: Dict[str, Any]) -> Tuple[List[Dict], bool]:
+    """Query receipts from Firestore using the converted filter, newest first; also reports whether the cap cut any off"""
     try:
         collection_ref = db.collection(COLLECTION_NAME)
         query = convert_mongo_to_firestore_query(firestore_filter, collection_ref)
+        # Newest first so the cap keeps recent receipts; one extra row shows whether more matched
+        query = (
+            query.select(RECEIPT_QUERY_FIELDS)
+            .order_by('date', direction=firestore.Query.DESCENDING)
+            .limit(RECEIPT_QUERY_LIMIT + 1)
+        )
         
-        # Execute query
-        docs = query.get()
-        
-        receipts = []
-        for doc in docs:
-            receipt_data = doc.to_dict()
-            receipt_data['id'] = doc.id  # Add document ID
-            receipts.append(receipt_data)
+        # Execute query in a worker thread; the sync client would block every other connection
+        docs = await asyncio.to_thread(query.get)
+        truncated = len(docs) > RECEIPT_QUERY_LIMIT
+        if truncated:
+            logger.warning(f"Receipt query hit the {RECEIPT_QUERY_LIMIT}-row cap: {firestore_filter}")
         
-        return receipts
+        # Add document ID in a single comprehension pass
+        return [{**doc.to_dict(), 'id': doc.id} for doc in docs[:RECEIPT_QUERY_LIMIT]], truncated
     except Exception as e:
         logger.error(f"Error querying Firestore: {str(e)}")
-        return []
+        return [], False
 
-async def polish_output(receipts: List[Dict], query: str, model) -> str:
-    """Polish the output using Gemini AI"""
-    receipts_json = json.dumps(receipts, default=str, indent=2)
+NO_RECEIPTS_ANSWER = "I couldn't find any receipts matching your query."
+
+async def polish_output(receipts: List[Dict], query: str, model, truncated: bool = False) -> AsyncIterator[str]:
+    """Polish the output using Gemini AI, yielding the answer as it streams in"""
+    # Nothing to summarize: skip the Gemini round-trip entirely
+    if not receipts:
+        yield NO_RECEIPTS_ANSWER
+        return
+    
+    cache_key = (frozenset(receipt.get('id') for receipt in receipts), normalize_query(query), truncated)
+    cached_answer = answer_cache.get(cache_key)
+    if cached_answer is not None:
+        logger.info("Answer cache hit")
+        yield cached_answer
+        return
+    
+    # Compact orjson dump: no indentation whitespace to build or send as prompt tokens
+    receipts_json = orjson.dumps(receipts, default=str).decode()
+    # A capped result set must not be presented as complete, e.g. in spending totals
+    truncation_note = (
+        f"\nNote: more receipts matched than could be included. This data is only the {len(receipts)} most recent. "
+        "Say clearly that any totals or counts cover only these receipts.\n"
+        if truncated else ""
+    )
     prompt = f"""
 Here is the filtered expense data in JSON:
 {receipts_json}
-
+{truncation_note}
 Answer this question based only on the above data:
 {query}
-
-Provide a clear, concise, and user-friendly answer. If no data is found, mention that no matching expenses were found for the query.
 """
     
+    chunks = []
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        response = await stream_content_with_retry(model, prompt)
+        # Release the slot taken by stream_content_with_retry once Gemini stops generating
+        try:
+            async for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield chunk.text
+        finally:
+            gemini_semaphore.release()
+        # Only complete, non-empty answers are cached; empty streams and the fallback below are retried next time
+        if chunks:
+            answer_cache[cache_key] = "".join(chunks)
     except Exception as e:
         logger.error(f"Error polishing output: {str(e)}")
-        return f"Found {len(receipts)} matching expenses. Please check the raw data for details."
+        # Once part of the answer has reached the client, leave it rather than append the fallback
+        if not chunks:
+            found = f"at least {len(receipts)}" if truncated else str(len(receipts))
+            yield f"Found {found} matching expenses. Please check the raw data for details."
 
 async def process_query(user_id: str, query: str, websocket: WebSocket):
     """Process a query and send real-time updates - ALWAYS filters by user's Gmail ID"""
+    # One timestamp per processing phase rather than one per message sent
+    now_iso = datetime.now().isoformat()
     try:
         # Validate user_id (Gmail ID) is provided
         if not user_id or not user_id.strip():
@@ -303,7 +474,7 @@ async def process_query(user_id: str, query: str, websocket: WebSocket):
                 "type": "error",
                 "success": False,
                 "error": "User Gmail ID is required for all queries",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             }, websocket)
             return
         
@@ -313,7 +484,7 @@ async def process_query(user_id: str, query: str, websocket: WebSocket):
                 "type": "error",
                 "success": False,
                 "error": "Invalid Gmail ID format. Please provide a valid email address.",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             }, websocket)
             return
         
@@ -324,54 +495,69 @@ async def process_query(user_id: str, query: str, websocket: WebSocket):
             "type": "status",
             "message": f"Processing query for user {user_id}...",
             "user_id": user_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         }, websocket)
         
-        # Initialize Gemini model
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        
         # Step 1: Generate MongoDB filter (ALWAYS includes user_id)
-        await manager.send_personal_message({
+        # Status frames are sent in the background so the Gemini call isn't held behind the write
+        status_task = asyncio.create_task(manager.send_personal_message({
             "type": "status",
             "message": "Generating database query with user filter...",
-            "timestamp": datetime.now().isoformat()
-        }, websocket)
+            "timestamp": now_iso
+        }, websocket))
         
-        firestore_filter = await generate_mongo_filter(user_id, query, model)
+        firestore_filter = await generate_mongo_filter(user_id, query, FILTER_MODEL)
+        await status_task
         
         # Double-check security: ensure user_id is in filter
         if "user_id" not in firestore_filter or firestore_filter["user_id"] != user_id:
             logger.error(f"Security violation: Filter missing user_id for {user_id}")
             firestore_filter["user_id"] = user_id
         
-        # Step 2: Fetch data (only for this user)
-        await manager.send_personal_message({
+        # Step 2: Fetch data (only for this user), overlapping the status send with the query
+        status_task = asyncio.create_task(manager.send_personal_message({
             "type": "status",
             "message": f"Searching user-specific data for {user_id}...",
-            "timestamp": datetime.now().isoformat()
-        }, websocket)
+            "timestamp": now_iso
+        }, websocket))
         
-        receipts = await query_firestore_receipts(firestore_filter)
+        receipts, truncated = await query_firestore_receipts(firestore_filter)
+        await status_task
+        if not receipts:
+            # Surfaces filters that match nothing (bad dates, wrong category) in the logs
+            logger.warning(f"No receipts matched filter for user {user_id}: {firestore_filter}")
+        now_iso = datetime.now().isoformat()
         
         # Send intermediate result
         await manager.send_personal_message({
             "type": "intermediate",
             "results_count": len(receipts),
+            "results_truncated": truncated,
             "firestore_filter": firestore_filter,
             "user_id": user_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         }, websocket)
         
         # Step 3: Polish output
         await manager.send_personal_message({
             "type": "status",
             "message": "Generating personalized response...",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         }, websocket)
         
-        answer = await polish_output(receipts, query, model)
+        # Forward the answer as it streams so the first words arrive before generation finishes
+        answer_parts = []
+        async for delta in polish_output(receipts, query, ANSWER_MODEL, truncated):
+            answer_parts.append(delta)
+            await manager.send_personal_message({
+                "type": "result_chunk",
+                "delta": delta,
+                "timestamp": now_iso
+            }, websocket)
+        answer = "".join(answer_parts)
+        now_iso = datetime.now().isoformat()
         
-        # Send final result
+        # Send final result (terminal message carrying the full answer)
         await manager.send_personal_message({
             "type": "result",
             "success": True,
@@ -379,8 +565,9 @@ async def process_query(user_id: str, query: str, websocket: WebSocket):
             "query_used": query,
             "user_id": user_id,
             "results_count": len(receipts),
+            "results_truncated": truncated,
             "firestore_filter": firestore_filter,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         }, websocket)
         
     except Exception as e:
@@ -442,7 +629,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
         while True:
             # Wait for query from client
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = orjson.loads(data)
             
             if message.get("type") == "query":
                 query = message.get("query", "")
@@ -487,7 +674,7 @@ async def websocket_endpoint_general(websocket: WebSocket):
     try:
         while True:
             data = await websocket.receive_text()
-            message = json.loads(data)
+            message = orjson.loads(data)
             
             if message.get("type") == "query":
                 user_id = message.get("user_id")  # Gmail ID from message
@@ -536,4 +723,14 @@ async def websocket_endpoint_general(websocket: WebSocket):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Incoming frames are short JSON queries, so a 1 MiB cap is ample; deflate shrinks the JSON replies
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        ws_max_size=2**20,
+        ws_max_queue=32,
+        ws_ping_interval=20,
+        ws_ping_timeout=20,
+        ws_per_message_deflate=True
+    )
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+One-off backfill of the numeric date_epoch field on existing receipts
+
+Receipts stored before Agent-2 started writing date_epoch only have the
+YYYY-MM-DD date string. Run this once, then set DATE_EPOCH_FILTERS=true
+on Agent-4 so date ranges are filtered on date_epoch.
+
+Usage:
+    python backfill_date_epoch.py            # write missing date_epoch values
+    python backfill_date_epoch.py --dry-run  # only report what would change
+"""
+
+import argparse
+import sys
+
+from main import db, date_to_epoch
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 500
+
+def backfill(dry_run: bool = False) -> dict:
+    """Write date_epoch from date on every receipt that is missing it"""
+    counts = {"scanned": 0, "updated": 0, "already_set": 0, "invalid_date": 0}
+    batch = db.batch()
+    pending = 0
+    
+    for doc in db.collection('receipts').select(['date', 'date_epoch']).stream():
+        counts["scanned"] += 1
+        data = doc.to_dict()
+        if data.get('date_epoch') is not None:
+            counts["already_set"] += 1
+            continue
+        
+        date_epoch = date_to_epoch(data.get('date'))
+        if date_epoch is None:
+            counts["invalid_date"] += 1
+            print(f"⚠️  Skipping {doc.id}: unparseable date {data.get('date')!r}")
+            continue
+        
+        counts["updated"] += 1
+        if dry_run:
+            continue
+        batch.update(doc.reference, {'date_epoch': date_epoch})
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    
+    if pending:
+        batch.commit()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill date_epoch on existing receipts")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    args = parser.parse_args()
+    
+    if not db:
+        print("❌ Firestore client not initialized")
+        sys.exit(1)
+    
+    counts = backfill(dry_run=args.dry_run)
+    action = "Would update" if args.dry_run else "Updated"
+    print(f"✅ Scanned {counts['scanned']} receipts: {action} {counts['updated']}, "
+          f"{counts['already_set']} already had date_epoch, {counts['invalid_date']} had no valid date")
+
+if __name__ == "__main__":
+    main()
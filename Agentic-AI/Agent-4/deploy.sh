@@ -24,7 +24,9 @@ gcloud run deploy $SERVICE_NAME \
     --timeout=300 \
     --max-instances=10 \
     --platform=managed \
-    --port=8000
+    --port=8000 \
+    --cpu=2 \
+    --set-env-vars=WEB_CONCURRENCY=2
 
 # Get the service URL
 SERVICE_URL=$(gcloud run services describe $SERVICE_NAME --region=$REGION --format="value(status.url)")
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Query, Path
+from fastapi import FastAPI, HTTPException, Query, Path, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any, Union
 import os
 import json
+import orjson
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import uuid
+from collections import Counter
+from operator import attrgetter
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -23,6 +28,9 @@ logger = logging.getLogger(__name__)
 # Get environment variables
 GOOGLE_PROJECT_ID = os.getenv("GOOGLE_PROJECT_ID")
 GOOGLE_SERVICE_ACCOUNT_PATH = os.getenv("GOOGLE_SERVICE_ACCOUNT_PATH")
+# Filter date ranges on the numeric date_epoch field; enable only after backfill_date_epoch.py has run,
+# since receipts stored before Agent-2 wrote date_epoch don't have the field
+DATE_EPOCH_FILTERS = os.getenv("DATE_EPOCH_FILTERS", "false").lower() == "true"
 
 # Initialize Firestore client
 try:
@@ -41,6 +49,19 @@ except Exception as e:
     logger.error(f"Failed to connect to Firestore: {str(e)}")
     db = None
 
+def orjson_default(value: Any):
+    """Serialize values orjson does not handle natively, such as Firestore's DatetimeWithNanoseconds"""
+    # datetime, date and Firestore's timestamp subclasses all expose isoformat()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+class OrjsonResponse(JSONResponse):
+    """JSONResponse rendered with orjson, tolerating Firestore types that skipped serialize_firestore_data"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=orjson_default)
+
 app = FastAPI(
     title="Receipt Data Fetch API",
     description="API to fetch user-specific receipt data from Google Cloud Firestore for frontend local storage",
@@ -56,6 +77,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON receipt listings (repeated keys/categories compress well)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Short-lived browser caching for cheap-to-stale endpoints; private keeps per-user data out of shared caches and CDNs
+SHORT_CACHE_CONTROL = "private, max-age=30"
+
 class ReceiptSummary(BaseModel):
     id: str
     vendor_name: Optional[str] = None
@@ -64,6 +91,9 @@ class ReceiptSummary(BaseModel):
     bill_category: Optional[str] = None
     created_at: Optional[str] = None
 
+# Fields read for list views; everything else stays in Firestore
+RECEIPT_SUMMARY_FIELDS = ['vendor_name', 'date', 'total_amount', 'bill_category', 'created_at']
+
 class ReceiptDetails(BaseModel):
     id: str
     user_id: str
@@ -126,6 +156,15 @@ def validate_email(email: str) -> bool:
     """Basic email validation"""
     return "@" in email and "." in email and len(email) > 5
 
+def date_to_epoch(date_str: Optional[str]) -> Optional[int]:
+    """Convert a YYYY-MM-DD date string to UTC epoch seconds (matches the stored date_epoch field)"""
+    if not date_str:
+        return None
+    try:
+        return int(datetime.strptime(date_str, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
 def serialize_firestore_data(data: dict) -> dict:
     """Convert Firestore data to JSON-serializable format"""
     if isinstance(data, dict):
@@ -137,40 +176,58 @@ def serialize_firestore_data(data: dict) -> dict:
     else:
         return data
 
-async def get_user_receipts_from_firestore(user_id: str, filters: Optional[FilterOptions] = None, limit: int = 100) -> List[dict]:
-    """Fetch user receipts from Firestore with optional filters"""
-    try:
-        if not db:
-            raise Exception("Firestore client not initialized")
+def build_user_receipts_query(user_id: str, filters: Optional[FilterOptions] = None, limit: int = 100):
+    """Build the Firestore query for a user's receipts with optional filters"""
+    # Start with user filter
+    query = db.collection('receipts').where('user_id', '==', user_id)
+    
+    # Apply additional filters if provided
+    if filters:
+        if filters.category:
+            query = query.where('bill_category', '==', filters.category)
         
-        # Start with user filter
-        query = db.collection('receipts').where('user_id', '==', user_id)
+        if filters.min_amount is not None:
+            query = query.where('total_amount', '>=', filters.min_amount)
         
-        # Apply additional filters if provided
-        if filters:
-            if filters.category:
-                query = query.where('bill_category', '==', filters.category)
-            
-            if filters.min_amount is not None:
-                query = query.where('total_amount', '>=', filters.min_amount)
-            
-            if filters.max_amount is not None:
-                query = query.where('total_amount', '<=', filters.max_amount)
+        if filters.max_amount is not None:
+            query = query.where('total_amount', '<=', filters.max_amount)
+        
+        # Date ranges use the numeric date_epoch field once it has been backfilled,
+        # otherwise the YYYY-MM-DD date string (composite indexes in firestore.indexes.json)
+        if DATE_EPOCH_FILTERS:
+            if filters.start_date:
+                query = query.where('date_epoch', '>=', date_to_epoch(filters.start_date))
             
+            if filters.end_date:
+                query = query.where('date_epoch', '<=', date_to_epoch(filters.end_date))
+        else:
             if filters.start_date:
                 query = query.where('date', '>=', filters.start_date)
             
             if filters.end_date:
                 query = query.where('date', '<=', filters.end_date)
-        
-        # Order by creation date (newest first)
-        query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
-        
-        # Limit results
-        query = query.limit(limit)
+    
+    # Order by creation date (newest first)
+    query = query.order_by('created_at', direction=firestore.Query.DESCENDING)
+    
+    # Limit results
+    return query.limit(limit)
+
+def get_snapshot_field(doc, field: str) -> Any:
+    """Read a single field from a Firestore snapshot, None if it is missing"""
+    try:
+        return doc.get(field)
+    except KeyError:
+        return None
+
+async def get_user_receipts_from_firestore(user_id: str, filters: Optional[FilterOptions] = None, limit: int = 100) -> List[dict]:
+    """Fetch user receipts from Firestore with optional filters"""
+    try:
+        if not db:
+            raise Exception("Firestore client not initialized")
         
         # Execute query
-        docs = query.get()
+        docs = build_user_receipts_query(user_id, filters, limit).get()
         
         receipts = []
         for doc in docs:
@@ -189,6 +246,34 @@ async def get_user_receipts_from_firestore(user_id: str, filters: Optional[Filte
         logger.error(f"Error fetching user receipts: {str(e)}")
         return []
 
+async def get_user_receipt_summaries_from_firestore(user_id: str, filters: Optional[FilterOptions] = None, limit: int = 100) -> List[ReceiptSummary]:
+    """Fetch user receipt summaries, reading only the summary fields from each snapshot"""
+    try:
+        if not db:
+            raise Exception("Firestore client not initialized")
+        
+        # Project server-side so embeddings and line items never leave Firestore
+        query = build_user_receipts_query(user_id, filters, limit).select(RECEIPT_SUMMARY_FIELDS)
+        
+        summaries = [
+            ReceiptSummary.model_construct(
+                id=doc.id,
+                vendor_name=get_snapshot_field(doc, 'vendor_name'),
+                date=get_snapshot_field(doc, 'date'),
+                total_amount=get_snapshot_field(doc, 'total_amount'),
+                bill_category=get_snapshot_field(doc, 'bill_category'),
+                created_at=serialize_firestore_data(get_snapshot_field(doc, 'created_at'))
+            )
+            for doc in query.stream()
+        ]
+        
+        logger.info(f"Retrieved {len(summaries)} receipt summaries for user: {user_id}")
+        return summaries
+        
+    except Exception as e:
+        logger.error(f"Error fetching user receipt summaries: {str(e)}")
+        return []
+
 async def get_receipt_by_id(receipt_id: str, user_id: str) -> Optional[dict]:
     """Get detailed receipt data by ID for a specific user"""
     try:
@@ -247,18 +332,16 @@ async def get_user_wallet_passes(user_id: str) -> List[dict]:
         logger.error(f"Error fetching wallet passes: {str(e)}")
         return []
 
-def calculate_user_analytics(receipts: List[dict]) -> Dict[str, Any]:
-    """Calculate analytics from user receipts"""
-    total_amount = sum(receipt.get('total_amount', 0) for receipt in receipts)
+def calculate_user_analytics(receipts: List[ReceiptSummary]) -> Dict[str, Any]:
+    """Calculate analytics from user receipt summaries"""
+    # filter(None, ...) drops missing amounts before summing
+    total_amount = sum(filter(None, map(attrgetter('total_amount'), receipts)))
     
     # Category breakdown
-    categories = {}
-    for receipt in receipts:
-        category = receipt.get('bill_category', 'Unknown')
-        categories[category] = categories.get(category, 0) + 1
+    categories = dict(Counter(receipt.bill_category or 'Unknown' for receipt in receipts))
     
     # Date range
-    dates = [receipt.get('date') for receipt in receipts if receipt.get('date')]
+    dates = list(filter(None, map(attrgetter('date'), receipts)))
     date_range = {}
     if dates:
         date_range = {
@@ -272,6 +355,21 @@ def calculate_user_analytics(receipts: List[dict]) -> Dict[str, Any]:
         'date_range': date_range
     }
 
+async def stream_analytics_json(header: Dict[str, Any], daily_spending: Dict[str, float], trailer: Dict[str, Any]):
+    """Emit the analytics JSON object incrementally: header fields, daily_spending entries, then the trailer"""
+    # Re-open the serialized header object so the remaining fields can be appended
+    yield orjson.dumps(header)[:-1] + b',"daily_spending":{'
+    
+    first = True
+    for date, amount in daily_spending.items():
+        yield (b'' if first else b',') + orjson.dumps(date) + b':' + orjson.dumps(amount)
+        first = False
+    yield b'}'
+    
+    for key, value in trailer.items():
+        yield b',' + orjson.dumps(key) + b':' + orjson.dumps(value)
+    yield b'}'
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -324,6 +422,13 @@ async def get_user_data(
                 detail="Firestore not configured"
             )
         
+        for label, value in (("start_date", start_date), ("end_date", end_date)):
+            if value and date_to_epoch(value) is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid {label} format, expected YYYY-MM-DD"
+                )
+        
         # Create filter options
         filters = FilterOptions(
             category=category,
@@ -333,28 +438,15 @@ async def get_user_data(
             end_date=end_date
         )
         
-        # Fetch user receipts
-        receipts = await get_user_receipts_from_firestore(user_id, filters, limit)
-        
-        # Convert to summary format for frontend
-        receipt_summaries = []
-        for receipt in receipts:
-            summary = ReceiptSummary(
-                id=receipt.get('id', ''),
-                vendor_name=receipt.get('vendor_name'),
-                date=receipt.get('date'),
-                total_amount=receipt.get('total_amount'),
-                bill_category=receipt.get('bill_category'),
-                created_at=receipt.get('created_at')
-            )
-            receipt_summaries.append(summary)
+        # Fetch user receipts already in summary format for frontend
+        receipt_summaries = await get_user_receipt_summaries_from_firestore(user_id, filters, limit)
         
         # Calculate analytics
-        analytics = calculate_user_analytics(receipts)
+        analytics = calculate_user_analytics(receipt_summaries)
         
         logger.info(f"Successfully fetched data for user: {user_id}")
         
-        return UserDataResponse(
+        response = UserDataResponse.model_construct(
             success=True,
             user_id=user_id,
             receipts=receipt_summaries,
@@ -366,6 +458,9 @@ async def get_user_data(
             message=f"Successfully fetched {len(receipt_summaries)} receipts for local storage"
         )
         
+        # Returning a Response directly skips FastAPI's response_model validation pass
+        return OrjsonResponse(content=response.model_dump())
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -455,7 +550,7 @@ async def get_user_wallet_passes_endpoint(
         # Convert to summary format
         pass_summaries = []
         for pass_data in passes:
-            summary = WalletPassSummary(
+            summary = WalletPassSummary.model_construct(
                 pass_id=pass_data.get('pass_id', ''),
                 receipt_id=pass_data.get('receipt_id'),
                 pass_url=pass_data.get('pass_url'),
@@ -466,7 +561,7 @@ async def get_user_wallet_passes_endpoint(
         
         logger.info(f"Successfully fetched wallet passes for user: {user_id}")
         
-        return UserWalletPassesResponse(
+        response = UserWalletPassesResponse.model_construct(
             success=True,
             user_id=user_id,
             wallet_passes=pass_summaries,
@@ -474,6 +569,8 @@ async def get_user_wallet_passes_endpoint(
             timestamp=datetime.now().isoformat()
         )
         
+        return OrjsonResponse(content=response.model_dump())
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -517,7 +614,7 @@ async def get_user_analytics(
         )
         
         # Fetch receipts for the period
-        receipts = await get_user_receipts_from_firestore(user_id, filters, 1000)
+        receipts = await get_user_receipt_summaries_from_firestore(user_id, filters, 1000)
         
         # Calculate detailed analytics
         analytics = calculate_user_analytics(receipts)
@@ -527,8 +624,8 @@ async def get_user_analytics(
         monthly_spending = {}
         
         for receipt in receipts:
-            date = receipt.get('date')
-            amount = receipt.get('total_amount', 0)
+            date = receipt.date
+            amount = receipt.total_amount or 0
             
             if date:
                 # Daily spending
@@ -544,7 +641,7 @@ async def get_user_analytics(
         
         logger.info(f"Successfully calculated analytics for user: {user_id}")
         
-        return {
+        header = {
             "success": True,
             "user_id": user_id,
             "period_days": days,
@@ -552,13 +649,19 @@ async def get_user_analytics(
             "total_amount": analytics['total_amount'],
             "average_daily_spending": round(avg_daily, 2),
             "average_transaction_amount": round(avg_transaction, 2),
-            "categories": analytics['categories'],
-            "daily_spending": daily_spending,
+            "categories": analytics['categories']
+        }
+        trailer = {
             "monthly_spending": monthly_spending,
             "date_range": analytics['date_range'],
             "timestamp": datetime.now().isoformat()
         }
         
+        return StreamingResponse(
+            stream_analytics_json(header, daily_spending, trailer),
+            media_type="application/json"
+        )
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -569,11 +672,12 @@ async def get_user_analytics(
         )
 
 @app.get("/categories")
-async def get_available_categories():
+async def get_available_categories(response: Response):
     """
     Get list of available bill categories
     Useful for frontend filter dropdowns
     """
+    response.headers["Cache-Control"] = SHORT_CACHE_CONTROL
     categories = [
         "Grocery", "Food", "Travel", "OTT", "Fuel", "Electronics", 
         "Healthcare", "Fashion", "Utility Bills", "Entertainment", 
@@ -588,7 +692,7 @@ async def get_available_categories():
     }
 
 @app.get("/user-summary/{user_id}")
-async def get_user_summary(user_id: str = Path(..., description="User's Gmail ID")):
+async def get_user_summary(response: Response, user_id: str = Path(..., description="User's Gmail ID")):
     """
     Get a quick summary of user's data
     Perfect for dashboard headers and overview components
@@ -624,6 +728,7 @@ async def get_user_summary(user_id: str = Path(..., description="User's Gmail ID
         
         logger.info(f"Successfully generated summary for user: {user_id}")
         
+        response.headers["Cache-Control"] = SHORT_CACHE_CONTROL
         return {
             "success": True,
             "user_id": user_id,
@@ -648,4 +753,11 @@ async def get_user_summary(user_id: str = Path(..., description="User's Gmail ID
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "4"))
+    )
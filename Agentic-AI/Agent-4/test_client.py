@@ -1,14 +1,22 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 
 # Configuration - Replace with your actual service URL after deployment
 BASE_URL = "https://receipt-data-fetch-api-593566622908.us-central1.run.app"
 USER_EMAIL = "test@gmail.com"  # Replace with actual Gmail ID
 
+# One keep-alive session for the sequential endpoint checks below
+session = requests.Session()
+_adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3))
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
 def test_health():
     """Test health endpoint"""
     print("🏥 Testing health endpoint...")
-    response = requests.get(f"{BASE_URL}/health")
+    response = session.get(f"{BASE_URL}/health")
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
     print()
@@ -16,7 +24,7 @@ def test_health():
 def test_user_data():
     """Test user data endpoint"""
     print("📊 Testing user data endpoint...")
-    response = requests.get(f"{BASE_URL}/user-data/{USER_EMAIL}")
+    response = session.get(f"{BASE_URL}/user-data/{USER_EMAIL}")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
         data = response.json()
@@ -37,7 +45,7 @@ def test_user_data_with_filters():
         "min_amount": 10.0,
         "limit": 5
     }
-    response = requests.get(f"{BASE_URL}/user-data/{USER_EMAIL}", params=params)
+    response = session.get(f"{BASE_URL}/user-data/{USER_EMAIL}", params=params)
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
         data = response.json()
@@ -50,7 +58,7 @@ def test_user_data_with_filters():
 def test_user_analytics():
     """Test user analytics"""
     print("📈 Testing user analytics...")
-    response = requests.get(f"{BASE_URL}/user-analytics/{USER_EMAIL}?days=30")
+    response = session.get(f"{BASE_URL}/user-analytics/{USER_EMAIL}?days=30")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
         data = response.json()
@@ -66,7 +74,7 @@ def test_user_analytics():
 def test_user_summary():
     """Test user summary"""
     print("📋 Testing user summary...")
-    response = requests.get(f"{BASE_URL}/user-summary/{USER_EMAIL}")
+    response = session.get(f"{BASE_URL}/user-summary/{USER_EMAIL}")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
         data = response.json()
@@ -82,7 +90,7 @@ def test_user_summary():
 def test_categories():
     """Test categories endpoint"""
     print("🏷️  Testing categories endpoint...")
-    response = requests.get(f"{BASE_URL}/categories")
+    response = session.get(f"{BASE_URL}/categories")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
         data = response.json()
@@ -94,7 +102,7 @@ def test_categories():
 def test_wallet_passes():
     """Test wallet passes endpoint"""
     print("🎫 Testing wallet passes endpoint...")
-    response = requests.get(f"{BASE_URL}/user-wallet-passes/{USER_EMAIL}")
+    response = session.get(f"{BASE_URL}/user-wallet-passes/{USER_EMAIL}")
     print(f"Status: {response.status_code}")
     if response.status_code == 200:
         data = response.json()
@@ -110,19 +118,19 @@ def simulate_frontend_usage():
     print("🖥️  Simulating frontend usage...")
     
     # 1. Get user summary for dashboard header
-    summary_response = requests.get(f"{BASE_URL}/user-summary/{USER_EMAIL}")
+    summary_response = session.get(f"{BASE_URL}/user-summary/{USER_EMAIL}")
     if summary_response.status_code == 200:
         summary = summary_response.json()
         print(f"Dashboard: {summary['total_receipts']} receipts, ${summary['recent_total_amount']:.2f} recent spending")
     
     # 2. Get categories for filter dropdown
-    categories_response = requests.get(f"{BASE_URL}/categories")
+    categories_response = session.get(f"{BASE_URL}/categories")
     if categories_response.status_code == 200:
         categories = categories_response.json()['categories']
         print(f"Filter options: {len(categories)} categories available")
     
     # 3. Get filtered data for current view
-    filtered_response = requests.get(f"{BASE_URL}/user-data/{USER_EMAIL}?limit=10")
+    filtered_response = session.get(f"{BASE_URL}/user-data/{USER_EMAIL}?limit=10")
     if filtered_response.status_code == 200:
         receipts = filtered_response.json()
         print(f"Current view: {receipts['total_count']} receipts loaded")
@@ -159,3 +167,5 @@ if __name__ == "__main__":
         print("❌ Connection error: Make sure the service is deployed and the URL is correct")
     except Exception as e:
         print(f"❌ Test failed: {str(e)}")
+    finally:
+        session.close()
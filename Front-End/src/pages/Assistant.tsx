@@ -19,8 +19,9 @@ interface Message {
 type ConnectionStatus = 'connecting' | 'connected' | 'disconnected' | 'error';
 
 interface WebSocketMessage {
-  type: 'status' | 'intermediate' | 'result' | 'error' | 'connection';
+  type: 'status' | 'intermediate' | 'result_chunk' | 'result' | 'error' | 'connection';
   message?: string;
+  delta?: string;
   answer?: string;
   error?: string;
   results_count?: number;
@@ -54,6 +55,8 @@ const Assistant = () => {
   const websocketRef = useRef<WebSocket | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
   const loadingTimeoutRef = useRef<NodeJS.Timeout | null>(null);
+  // Id of the assistant message that result_chunk deltas are appended to
+  const streamingMessageIdRef = useRef<string | null>(null);
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
   
@@ -240,11 +243,40 @@ const Assistant = () => {
         });
         break;
         
+      case 'result_chunk':
+        // Streamed part of the answer - append to the in-progress message, starting it on the first chunk
+        if (!data.delta) break;
+        const delta = data.delta;
+        if (streamingMessageIdRef.current === null) {
+          const streamingId = messageId;
+          streamingMessageIdRef.current = streamingId;
+          setMessages(prev => [...prev.filter(msg => !msg.isProcessing), {
+            id: streamingId,
+            type: 'assistant',
+            content: delta,
+            timestamp: new Date()
+          }]);
+          setIsLoading(false);
+          
+          // The answer is arriving, so the request is no longer at risk of timing out
+          if (loadingTimeoutRef.current) {
+            clearTimeout(loadingTimeoutRef.current);
+          }
+        } else {
+          const streamingId = streamingMessageIdRef.current;
+          setMessages(prev => prev.map(msg =>
+            msg.id === streamingId ? { ...msg, content: msg.content + delta } : msg
+          ));
+        }
+        break;
+        
       case 'result':
-        // Final result - use data.answer instead of data.message
+        // Final result - use data.answer instead of data.message; replaces any streamed message
         const resultMessage = data.answer || data.message || 'No response received';
+        const streamedId = streamingMessageIdRef.current;
+        streamingMessageIdRef.current = null;
         setMessages(prev => {
-          const filtered = prev.filter(msg => !msg.isProcessing);
+          const filtered = prev.filter(msg => !msg.isProcessing && msg.id !== streamedId);
           return [...filtered, {
             id: messageId,
             type: 'assistant',
@@ -263,6 +295,7 @@ const Assistant = () => {
       case 'error':
         // Handle error messages - use data.error instead of data.message
         const errorMessage = data.error || data.message || 'An unknown error occurred';
+        streamingMessageIdRef.current = null;
         setMessages(prev => {
           const filtered = prev.filter(msg => !msg.isProcessing);
           return [...filtered, {
@@ -331,6 +364,7 @@ const Assistant = () => {
     };
 
     setMessages(prev => [...prev, userMessage]);
+    streamingMessageIdRef.current = null;
     const query = inputValue;
     setInputValue('');
     setIsLoading(true);
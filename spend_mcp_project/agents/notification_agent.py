@@ -1,5 +1,9 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 class NotificationAgent:
-    def run(self, pass_data):
-        print("[Agent] Sending notification...")
+    async def run(self, pass_data):
+        logger.info("[Agent] Sending notification...")
         print(f"🔔 {pass_data['summary']}")
         print(f"📝 {pass_data['details']}")
\ No newline at end of file
@@ -1,6 +1,11 @@
+import asyncio
+import logging
+
 from tools.firestore_tool import get_receipts
 
+logger = logging.getLogger(__name__)
+
 class ReceiptFetcherAgent:
-    def run(self, user_id):
-        print("[Agent] Fetching receipts...")
-        return get_receipts(user_id)
\ No newline at end of file
+    async def run(self, user_id):
+        logger.info("[Agent] Fetching receipts...")
+        return await asyncio.to_thread(get_receipts, user_id)
\ No newline at end of file
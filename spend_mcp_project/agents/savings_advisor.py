@@ -1,6 +1,11 @@
+import asyncio
+import logging
+
 from tools.prompt_tool import generate_savings_tips
 
+logger = logging.getLogger(__name__)
+
 class SavingsAdvisorAgent:
-    def run(self, summary, subscriptions):
-        print("[Agent] Generating savings advice...")
-        return generate_savings_tips(summary, subscriptions)
\ No newline at end of file
+    async def run(self, summary, subscriptions):
+        logger.info("[Agent] Generating savings advice...")
+        return await asyncio.to_thread(generate_savings_tips, summary, subscriptions)
\ No newline at end of file
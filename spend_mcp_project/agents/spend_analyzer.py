@@ -1,21 +1,24 @@
-from collections import defaultdict
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 class SpendAnalyzerAgent:
-    def run(self, receipts):
-        print("[Agent] Analyzing spend...")
-        summary = {
-            "total_spend": 0,
-            "category_spend": defaultdict(float),
+    async def run(self, receipts):
+        logger.info("[Agent] Analyzing spend...")
+        return await asyncio.to_thread(self._summarize, receipts)
+
+    def _summarize(self, receipts):
+        # get_receipts has already coerced amount to float and defaulted category to "other"
+        amounts = np.fromiter((r["amount"] for r in receipts), dtype=np.float64, count=len(receipts))
+        cats = np.array([r["category"] for r in receipts], dtype=object)
+        # One pass: encode categories to ints, then sum amounts per category code
+        keys, inv = np.unique(cats, return_inverse=True)
+        sums = np.bincount(inv, weights=amounts, minlength=len(keys))
+        return {
+            "total_spend": float(amounts.sum()),
+            "category_spend": dict(zip(keys.tolist(), sums.tolist())),
             "trends": {}
         }
-        for r in receipts:
-            print("Receipt amount field:", r.get("amount"))
-        try:
-            amt = float(r.get("amount", 0))
-        except Exception as e:
-            print(f"Invalid amount: {r.get('amount')}, error: {e}")
-            amt = 0
-        cat = r.get("category", "other")
-        summary["category_spend"][cat] += amt
-        summary["total_spend"] += amt
-        return summary
\ No newline at end of file
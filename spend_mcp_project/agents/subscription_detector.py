@@ -1,12 +1,23 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_TAG = "subscription"
+
 class SubscriptionDetectorAgent:
-    def run(self, receipts):
-        print("[Agent] Detecting subscriptions...")
-        subs = []
-        for r in receipts:
-            if "subscription" in r.get("tags", []):
-                subs.append({
-                    "name": r["merchant"],
-                    "amount": r["amount"],
-                    "frequency": "monthly"  # simplified assumption
-                })
-        return subs
\ No newline at end of file
+    async def run(self, receipts):
+        logger.info("[Agent] Detecting subscriptions...")
+        return await asyncio.to_thread(self._detect, receipts)
+
+    def _detect(self, receipts):
+        # tags arrive as a tuple (empty when untagged) from get_receipts
+        return [
+            {
+                "name": r["merchant"],
+                "amount": r["amount"],
+                "frequency": "monthly"  # simplified assumption
+            }
+            for r in receipts
+            if SUBSCRIPTION_TAG in r["tags"]
+        ]
\ No newline at end of file
@@ -1,8 +1,15 @@
+import logging
+from string import Template
+
+logger = logging.getLogger(__name__)
+
+PASS_SUMMARY_TEMPLATE = Template("Total spend: ₹$total")
+
 class WalletPassGeneratorAgent:
-    def run(self, summary, tips):
-        print("[Agent] Creating Wallet Pass...")
+    async def run(self, summary, tips, user_id):
+        logger.info("[Agent] Creating Wallet Pass...")
         return {
-            "pass_id": "wallet_user123",
-            "summary": f"Total spend: ₹{summary['total_spend']}",
-            "details": "\n".join([tip["suggestion"] for tip in tips])
+            "pass_id": f"wallet_{user_id}",
+            "summary": PASS_SUMMARY_TEMPLATE.substitute(total=format(summary["total_spend"], ".2f")),
+            "details": "\n".join(tip["suggestion"] for tip in tips)
         }
\ No newline at end of file
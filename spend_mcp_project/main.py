@@ -1,3 +1,6 @@
+import asyncio
+import logging
+
 from agents.receipt_fetcher import ReceiptFetcherAgent
 from agents.spend_analyzer import SpendAnalyzerAgent
 from agents.subscription_detector import SubscriptionDetectorAgent
@@ -5,15 +8,53 @@ from agents.savings_advisor import SavingsAdvisorAgent
 from agents.wallet_pass_generator import WalletPassGeneratorAgent
 from agents.notification_agent import NotificationAgent
 
-def run_pipeline(user_id):
-    print(f"[MCP] Running spend analysis for user: {user_id}")
+logger = logging.getLogger(__name__)
+
+# Notifications run in the background; keep references so pending tasks aren't garbage collected
+_pending_notifications = set()
+
+def _notification_done(task):
+    _pending_notifications.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Notification failed: {task.exception()}")
+
+async def wait_for_notifications():
+    # asyncio.run cancels leftover tasks on exit, so drivers drain notifications before returning
+    if _pending_notifications:
+        await asyncio.gather(*_pending_notifications, return_exceptions=True)
+
+async def run_pipeline(user_id):
+    logger.info(f"[MCP] Running spend analysis for user: {user_id}")
+
+    receipts = await ReceiptFetcherAgent().run(user_id)
+    # Both only read receipts, so they run side by side
+    summary, subscriptions = await asyncio.gather(
+        SpendAnalyzerAgent().run(receipts),
+        SubscriptionDetectorAgent().run(receipts)
+    )
+    tips = await SavingsAdvisorAgent().run(summary, subscriptions)
+    pass_data = await WalletPassGeneratorAgent().run(summary, tips, user_id)
+    # Notifier latency stays off the pipeline's critical path
+    task = asyncio.create_task(NotificationAgent().run(pass_data))
+    _pending_notifications.add(task)
+    task.add_done_callback(_notification_done)
+
+async def run_pipeline_many(user_ids, concurrency=8):
+    # The Firestore client is shared, so up to `concurrency` users' queries and LLM calls overlap
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _one(user_id):
+        async with sem:
+            await run_pipeline(user_id)
+
+    await asyncio.gather(*(_one(user_id) for user_id in user_ids))
+    await wait_for_notifications()
 
-    receipts = ReceiptFetcherAgent().run(user_id)
-    summary = SpendAnalyzerAgent().run(receipts)
-    subscriptions = SubscriptionDetectorAgent().run(receipts)
-    tips = SavingsAdvisorAgent().run(summary, subscriptions)
-    pass_data = WalletPassGeneratorAgent().run(summary, tips)
-    NotificationAgent().run(pass_data)
+async def main(user_id):
+    await run_pipeline(user_id)
+    await wait_for_notifications()
 
 if __name__ == "__main__":
-    run_pipeline("psrahul2002@gmail.com")
\ No newline at end of file
+    # INFO keeps stage progress visible; per-call debug detail is skipped without being formatted
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main("psrahul2002@gmail.com"))
\ No newline at end of file
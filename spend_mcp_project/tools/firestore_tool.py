@@ -1,14 +1,135 @@
+import asyncio
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from functools import cache
+
 import firebase_admin
+from cachetools import TTLCache
 from firebase_admin import credentials, firestore
 
-if not firebase_admin._apps:
-    cred = credentials.Certificate("credentials/service_account.json")
-    firebase_admin.initialize_app(cred)
+logger = logging.getLogger(__name__)
+
+# Only the fields the analyzer and subscription detector read
+RECEIPT_FIELDS = ["amount", "category", "tags", "merchant", "timestamp"]
+
+# Firestore caps an "in" filter at 30 values
+IN_QUERY_LIMIT = 30
+
+# Repeat runs for the same user within the TTL skip the Firestore round-trip;
+# maxsize bounds memory when many distinct users are processed
+RECEIPT_CACHE_TTL_SECONDS = 60.0
+RECEIPT_CACHE_MAX_USERS = 1024
+_receipt_cache = TTLCache(maxsize=RECEIPT_CACHE_MAX_USERS, ttl=RECEIPT_CACHE_TTL_SECONDS)
+# get_receipts runs on asyncio.to_thread workers and TTLCache is not thread-safe
+_receipt_cache_lock = threading.Lock()
+
+# Recent per-query read latencies, to check that concurrent reads overlap on the shared channel
+QUERY_LATENCY_WINDOW = 200
+_query_latencies = deque(maxlen=QUERY_LATENCY_WINDOW)
+# Reads run on asyncio.to_thread workers, so the window is appended to from several threads
+_query_latencies_lock = threading.Lock()
+
+def _record_query_latency(started):
+    with _query_latencies_lock:
+        _query_latencies.append(time.perf_counter() - started)
+        window = list(_query_latencies)
+    if logger.isEnabledFor(logging.DEBUG) and len(window) >= 2:
+        cuts = statistics.quantiles(window, n=20)
+        logger.debug(f"Firestore read latency p50={cuts[9] * 1000:.1f}ms p95={cuts[18] * 1000:.1f}ms over {len(window)} reads")
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _normalize_receipt(receipt):
+    # Coerce once at read time so the agents can index fields directly without per-receipt guards
+    receipt["amount"] = _to_float(receipt.get("amount"))
+    receipt["category"] = receipt.get("category") or "other"
+    receipt["tags"] = tuple(receipt.get("tags") or ())
+    return receipt
 
-db = firestore.client()
+# First calls can arrive from several asyncio.to_thread workers at once; @cache doesn't serialize them
+_db_init_lock = threading.Lock()
+
+@cache
+def _get_db():
+    # Created on first use, so importing this module doesn't need credentials
+    with _db_init_lock:
+        if not firebase_admin._apps:
+            cred = credentials.Certificate("credentials/service_account.json")
+            firebase_admin.initialize_app(cred)
+        return firestore.client()
 
 def get_receipts(user_id):
-    docs = db.collection("receipts").where("user_id", "==", user_id).stream()
-    docs_list = list(docs)
-    print(f"Found {(docs_list)} receipts for user {user_id}")
-    return [doc.to_dict() for doc in docs_list]
\ No newline at end of file
+    with _receipt_cache_lock:
+        cached = _receipt_cache.get(user_id)
+    if cached is not None:
+        logger.debug(f"Using cached receipts for user {user_id}")
+        return cached
+
+    # Built straight from the stream, so snapshots and dicts are never both held in full
+    started = time.perf_counter()
+    receipts = list(iter_receipts(user_id))
+    _record_query_latency(started)
+    logger.info(f"Found {len(receipts)} receipts for user {user_id}")
+    with _receipt_cache_lock:
+        _receipt_cache[user_id] = receipts
+    return receipts
+
+def iter_receipts(user_id):
+    # Single-pass consumers can use this directly and never materialize the receipt set
+    query = (
+        _get_db().collection("receipts")
+        .where(filter=firestore.FieldFilter("user_id", "==", user_id))
+        .select(RECEIPT_FIELDS)
+    )
+    for snap in query.stream():
+        yield _normalize_receipt(snap.to_dict())
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _query_receipts_in(user_ids):
+    started = time.perf_counter()
+    snaps = (
+        _get_db().collection("receipts")
+        .where(filter=firestore.FieldFilter("user_id", "in", user_ids))
+        .select(RECEIPT_FIELDS + ["user_id"])
+        .get()
+    )
+    _record_query_latency(started)
+    return snaps
+
+async def get_receipts_many(user_ids):
+    # Multi-user fetch: one "in" query per IN_QUERY_LIMIT ids instead of one query per user
+    results = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        with _receipt_cache_lock:
+            cached = _receipt_cache.get(user_id)
+        if cached is not None:
+            results[user_id] = cached
+        else:
+            results[user_id] = []
+            missing.append(user_id)
+
+    # Keep to IN_QUERY_LIMIT ids per query; the chunks run concurrently on the shared client
+    snap_lists = await asyncio.gather(
+        *(asyncio.to_thread(_query_receipts_in, chunk) for chunk in _chunks(missing, IN_QUERY_LIMIT))
+    )
+    for snaps in snap_lists:
+        for snap in snaps:
+            receipt = snap.to_dict()
+            results[receipt.pop("user_id")].append(_normalize_receipt(receipt))
+
+    with _receipt_cache_lock:
+        for user_id in missing:
+            _receipt_cache[user_id] = results[user_id]
+    logger.info(f"Found {sum(len(r) for r in results.values())} receipts for {len(results)} users")
+    return results
@@ -1,15 +1,54 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Tips depend only on (summary, subscriptions), so unchanged inputs reuse the last answer
+TIPS_CACHE_MAXSIZE = 256
+_tips_cache = OrderedDict()
+# Advisor runs via asyncio.to_thread, so concurrent pipelines touch the cache from several threads
+_tips_cache_lock = threading.Lock()
+
+HIGH_SPEND_THRESHOLD = 1000
+HIGH_SPEND_TIP = "Consider reducing spend in {category} — try cheaper options."
+SUBSCRIPTION_TIP = "Review your {name} subscription. Consider pausing if not used."
+
+def _tips_cache_key(summary, subscriptions):
+    canonical = json.dumps(
+        [
+            sorted(summary["category_spend"].items()),
+            sorted((sub["name"], sub["amount"]) for sub in subscriptions)
+        ],
+        default=str
+    )
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
 def generate_savings_tips(summary, subscriptions):
-    print("[Tool] Using mock LLM to generate savings...")
-    tips = []
-    for category, amount in summary["category_spend"].items():
-        if amount > 1000:
-            tips.append({
-                "category": category,
-                "suggestion": f"Consider reducing spend in {category} — try cheaper options."
-            })
-    for sub in subscriptions:
-        tips.append({
-            "category": "subscriptions",
-            "suggestion": f"Review your {sub['name']} subscription. Consider pausing if not used."
-        })
+    key = _tips_cache_key(summary, subscriptions)
+    with _tips_cache_lock:
+        cached = _tips_cache.get(key)
+        if cached is not None:
+            _tips_cache.move_to_end(key)
+    if cached is not None:
+        logger.debug("[Tool] Using cached savings tips...")
+        return cached
+
+    logger.debug("[Tool] Using mock LLM to generate savings...")
+    # Only categories over the threshold get a suggestion string built at all
+    tips = [
+        {"category": category, "suggestion": HIGH_SPEND_TIP.format(category=category)}
+        for category, amount in summary["category_spend"].items()
+        if amount > HIGH_SPEND_THRESHOLD
+    ]
+    tips.extend(
+        {"category": "subscriptions", "suggestion": SUBSCRIPTION_TIP.format(name=sub["name"])}
+        for sub in subscriptions
+    )
+    with _tips_cache_lock:
+        _tips_cache[key] = tips
+        if len(_tips_cache) > TIPS_CACHE_MAXSIZE:
+            _tips_cache.popitem(last=False)
     return tips
\ No newline at end of file